@@ -0,0 +1,280 @@
+#benchmark of the render path on a (CPython) host, using the headless display backend
+#replays scripted touch traces against the layout of main.py and reports the render cost,
+#the dispatch of a slow slider command
+#and the time and heap to the first frame with eagerly and lazily built pages
+#and the heap per widget of the basic widget types
+#and the cost of a scroll step of a ListView, scrolled by the panel (portrait) or redrawn (landscape)
+#usage: python bench.py [--json]
+import sys
+import json
+import time
+import asyncio
+import tracemalloc
+import microgui as gui
+
+class BenchVar(gui.Var):
+    #counts the value assignments
+    updates=0
+
+    @property
+    def val(self):
+        return gui.Var.val.fget(self)
+
+    @val.setter
+    def val(self, val):
+        BenchVar.updates+=1
+        gui.Var.val.fset(self, val)
+
+async def slow_bus(val):
+    #stand-in for a light controller on a bus
+    await asyncio.sleep(0.02)
+
+def build(screen, lazy=True):
+    #same widget tree as main.py, lazy=False builds all pages up front
+    #returns the commands of the sliders
+    def add(menue, builder, **kwargs):
+        page=menue.add_page(builder=builder, **kwargs)
+        if not lazy:
+            page.build()
+    bgled=BenchVar(100)
+    lights=[BenchVar(0) for l in range(2)]
+    bastel_lights=[[BenchVar(0) for l in range(2)] for i in range(3)]
+    bus=gui.Command(slow_bus)
+    def build_licht(page):
+        licht_menue=gui.Menue(60, side=0)
+        page.pack(licht_menue)
+        add(licht_menue, build_wohnzimmer, title='Wohnzi.', side=0, title_fg=screen.BLACK, title_bg=screen.YELLOW)
+        add(licht_menue, build_schlafzimmer, title='Schlafzi.', side=1,title_fg=screen.BLACK,title_bg=screen.YELLOW)
+        add(licht_menue, build_bastelzimmer, title='Bastelzi.', title_fg=screen.BLACK, title_bg=screen.YELLOW)
+    def build_wohnzimmer(page):
+        for l in range(2):
+            lf=gui.Frame(side=1)
+            page.pack(lf)
+            lf.pack(gui.Label(l+1, decoration='L{}: '))
+            lf.pack(gui.Slider(lights[l]), size=4)
+            lf.pack(gui.Label(lights[l], decoration='{}%'))
+    def build_schlafzimmer(page):
+        page.pack(gui.Label('Schlafzimmer'))
+        page.pack(gui.Label('2. Label'))
+    def build_bastelzimmer(page):
+        submenue=gui.Menue(60,side=1)
+        page.pack(submenue)
+        for i in range(3):
+            add(submenue, lambda p, i=i: build_bastel_licht(p, i), title= 'Licht {}'.format(i+1), title_bg=screen.RED,side=1)
+    def build_bastel_licht(page, i):
+        for l in range(2):
+            lf=gui.Frame(side=0)
+            page.pack(lf)
+            lval=bastel_lights[i][l]
+            lf.pack(gui.Label(l+1, decoration='L{}: '))
+            lf.pack(gui.Slider(lval, horizontal=False), size=4)
+            lf.pack(gui.Label(lval, decoration='{}%'))
+    def build_settings(page):
+        page.pack(gui.Label('Hintergrundbeleuchtung'))
+        page.pack(gui.Frame(side=1))
+        page.widgets[-1].pack(gui.Slider(bgled,min=1, command=bus, live=10), size=5)
+        page.widgets[-1].pack(gui.Label(bgled, decoration='{}%'))
+        page.pack(gui.Label('weitere Einstellungen'), size=4)
+    top_menue=gui.Menue(60, side=1, keep=300000)
+    screen.root=top_menue
+    add(top_menue, build_licht, title='Licht', title_fg=screen.BLACK, title_bg=screen.YELLOW)
+    add(top_menue, lambda p: p.pack(gui.Label('hier steuert man die anlage')), title='Musik', title_fg=screen.WHITE, title_bg=screen.RED)
+    add(top_menue, lambda p: p.pack(gui.Label('bestimmt bald wieder gut')), title='Wetter', title_fg=screen.WHITE, title_bg=screen.BLUE)
+    add(top_menue, lambda p: p.pack(gui.Clock()), title='Uhr', title_fg=screen.BLACK, title_bg=screen.GREEN)
+    add(top_menue, build_settings, title='Settings', title_fg=screen.BLACK, title_bg=screen.YELLOW)
+    add(top_menue, lambda p: p.pack(gui.Label('Fotos')), title='Fotos', title_fg=screen.WHITE, title_bg=screen.RED)
+    return [bus]
+
+def count_widgets(w):
+    n=1
+    for c in getattr(w, 'widgets', [])+getattr(w, 'pages', []):
+        n+=count_widgets(c)
+    return n
+
+def tap(trace, x, y):
+    return trace.press(x,y,2).release(2)
+
+#touch traces in screen coordinates of the 320x240 landscape layout
+def trace_tabs():
+    t=gui.ScriptedTouch()
+    for i in list(range(6))+[0]:
+        tap(t, 30, 20+40*i)
+    return t
+
+def trace_slider_drag():
+    t=gui.ScriptedTouch()
+    tap(t, 30, 20)#Licht
+    t.press(110,105).drag((110,105),(270,105),40).drag((270,105),(110,105),40).release(2)
+    return t
+
+def trace_nested():
+    t=gui.ScriptedTouch()
+    tap(t, 30, 20)#Licht
+    tap(t, 280, 30)#Bastelzi.
+    for i in range(3):
+        tap(t, 90, 80+60*i)
+        t.press(270,200).drag((270,200),(270,100),30).release(2)
+    return t
+
+def trace_settings():
+    t=gui.ScriptedTouch()
+    tap(t, 30, 180)#Settings
+    t.press(80,60).drag((80,60),(250,60),40).release(2)
+    return t
+
+TRACES=[('tabs',trace_tabs), ('slider drag',trace_slider_drag), ('nested menue',trace_nested), ('settings',trace_settings)]
+CONFIGS=[('direct',{}), ('fb full',{'fb_size':None}), ('fb band16',{'fb_size':320*16*2}),
+    ('retained',{'retained':True}), ('fb16 retained',{'fb_size':320*16*2,'retained':True})]
+
+def percentile(vals, p):
+    if not vals:
+        return 0
+    vals=sorted(vals)
+    return vals[min(len(vals)-1,len(vals)*p//100)]
+
+def close(loop):
+    tasks=asyncio.all_tasks(loop)
+    for task in tasks:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    loop.close()
+
+def run(trace, config):
+    loop=asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    tft=gui.HeadlessTFT()
+    screen=gui.MicroGUI(tft)
+    screen.init(screen.ILI9488, width=240, height=320, rot=screen.LANDSCAPE_FLIP, **config)
+    screen.touch_fast=1
+    screen.touch_slow=2
+    commands=build(screen)
+    screen.draw()
+    prof=screen.profile()
+    prof.reset()
+    tft.reset_stats()
+    pixels=screen.pixels
+    BenchVar.updates=0
+    screen.touch_source=trace
+    async def wait():
+        while not trace.done:
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.01)
+        while screen.renderer.pending(): #the last frame
+            await asyncio.sleep(0.005)
+        screen.initiated=0
+    loop.run_until_complete(wait())
+    close(loop)
+    latency=prof.touch_latency.values()
+    render=screen.renderer.stats()
+    draws=sum(r[0] for r in prof.widgets.values())
+    cmd_latency=[v for c in commands for v in c.latency.values()]
+    return {'frames':prof.flush_time.n,
+        'pixels':screen.pixels-pixels,
+        'transactions':tft.transactions,
+        'spi_ms':round(tft.spi_time()*1000,1),
+        'var_updates':BenchVar.updates,
+        'draws_per_update':round(draws/BenchVar.updates,2) if BenchVar.updates else 0,
+        'latency_p50_us':percentile(latency,50),
+        'latency_p90_us':percentile(latency,90),
+        'latency_p99_us':percentile(latency,99),
+        'cmd_calls':sum(c.stats['calls'] for c in commands),
+        'cmd_dropped':sum(c.stats['dropped'] for c in commands),
+        'cmd_p90_us':percentile(cmd_latency,90),
+        'requests':render['requests'],
+        'queue_max':render['queue'].get('max',0),
+        'input_max_us':render['input_us'].get('max',0)}
+
+def boot(lazy):
+    #time from creating the screen to the first frame and the python heap used by the widgets
+    loop=asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    t=time.perf_counter()
+    screen=gui.MicroGUI(gui.HeadlessTFT())
+    screen.init(screen.ILI9488, width=240, height=320, rot=screen.LANDSCAPE_FLIP)
+    tracemalloc.start() #the widgets, not the buffer of the headless panel
+    build(screen, lazy)
+    screen.draw()
+    ms=(time.perf_counter()-t)*1000
+    heap,peak=tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    screen.initiated=0
+    close(loop)
+    return {'first_frame_ms':round(ms,1), 'heap_bytes':heap, 'heap_peak':peak, 'widgets':count_widgets(screen.root)}
+
+def footprint(n=100):
+    #python heap per widget, including the layout in a frame
+    screen=gui.MicroGUI(gui.HeadlessTFT())
+    kinds=[('Label',lambda i: gui.Label('Label {}'.format(i))),
+        ('Slider',lambda i: gui.Slider(gui.Var(i))),
+        ('Frame',lambda i: gui.Frame(side=i%2))]
+    result={}
+    for name,make in kinds:
+        root=gui.Frame()
+        tracemalloc.start()
+        widgets=[make(i) for i in range(n)]
+        for w in widgets:
+            root.pack(w)
+        root.place(screen, [0,0,320,240])
+        root.layout(root.win)
+        heap,peak=tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result[name]=heap//n
+    return result
+
+def list_scroll(rot, n, steps=40, d=5):
+    #scroll steps of d pixels through a list of n items
+    loop=asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    tft=gui.HeadlessTFT()
+    screen=gui.MicroGUI(tft)
+    screen.init(screen.ILI9488, width=240, height=320, rot=rot)
+    lv=gui.ListView(['Eintrag {}'.format(i) for i in range(n)])
+    screen.root=gui.Frame(side=0)
+    screen.root.pack(gui.Label('Liste'))
+    screen.root.pack(lv, size=6)
+    screen.draw()
+    tft.reset_stats()
+    pixels=screen.pixels
+    t=time.perf_counter()
+    for i in range(steps):
+        lv.scroll_to(lv.offset+d)
+        screen.flush()
+    us=(time.perf_counter()-t)*1000000
+    screen.initiated=0
+    close(loop)
+    return {'pixels_per_step':(screen.pixels-pixels)//steps, 'us_per_step':round(us/steps), 'spi_ms_per_step':round(tft.spi_time()*1000/steps,2)}
+
+def main(argv):
+    results={}
+    for tname,trace in TRACES:
+        for cname,config in CONFIGS:
+            results[tname+'/'+cname]=run(trace(), config)
+    boots={'eager':boot(False), 'lazy':boot(True)}
+    sizes=footprint()
+    lists={}
+    for rname,rot in (('hw scroll',gui.HeadlessTFT.PORTRAIT), ('redraw',gui.HeadlessTFT.LANDSCAPE)):
+        for n in (100, 10000):
+            lists['{} {}'.format(rname, n)]=list_scroll(rot, n)
+    if '--json' in argv:
+        print(json.dumps({'traces':results, 'boot':boots, 'bytes_per_widget':sizes, 'list':lists}, indent=1, sort_keys=True))
+        return
+    cols=['frames','pixels','transactions','spi_ms','var_updates','draws_per_update','latency_p50_us','latency_p90_us','latency_p99_us','cmd_calls','cmd_dropped','cmd_p90_us','requests','queue_max','input_max_us']
+    print('{:24}'.format('trace/config')+''.join('{:>17}'.format(c) for c in cols))
+    for name,r in results.items():
+        print('{:24}'.format(name)+''.join('{:>17}'.format(r[c]) for c in cols))
+    print()
+    cols=['first_frame_ms','heap_bytes','heap_peak','widgets']
+    print('{:24}'.format('boot')+''.join('{:>17}'.format(c) for c in cols))
+    for name,r in boots.items():
+        print('{:24}'.format(name)+''.join('{:>17}'.format(r[c]) for c in cols))
+    print()
+    print('{:24}'.format('bytes per widget')+''.join('{:>17}'.format(name) for name in sizes))
+    print('{:24}'.format('')+''.join('{:>17}'.format(v) for v in sizes.values()))
+    print()
+    cols=['pixels_per_step','us_per_step','spi_ms_per_step']
+    print('{:24}'.format('list scroll')+''.join('{:>17}'.format(c) for c in cols))
+    for name,r in lists.items():
+        print('{:24}'.format(name)+''.join('{:>17}'.format(r[c]) for c in cols))
+
+if __name__=='__main__':
+    main(sys.argv[1:])
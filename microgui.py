@@ -1,8 +1,77 @@
-import display
-from machine import PWM, RTC
-import utime
-import time
-import uasyncio as asyncio
+try:
+    import display
+except ImportError: #no display module, e.g. CPython with the HeadlessTFT backend
+    display=None
+try:
+    from machine import PWM, RTC, Pin
+except ImportError:
+    PWM=RTC=Pin=None
+try:
+    from utime import ticks_ms, ticks_us, ticks_diff, ticks_add, localtime
+except ImportError: #CPython
+    import time
+    def ticks_ms():
+        return int(time.monotonic()*1000)
+    def ticks_us():
+        return int(time.monotonic()*1000000)
+    def ticks_diff(a,b):
+        return a-b
+    def ticks_add(a,b):
+        return a+b
+    localtime=time.localtime
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+try:
+    import micropython
+except ImportError:
+    micropython=None
+try:
+    import ujson as json
+except ImportError:
+    import json
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+try:
+    import uos as os
+except ImportError:
+    import os
+from array import array
+import gc
+
+_BOOT=ticks_ms() #import of the module, taken as the start of the boot
+
+if micropython is not None and hasattr(micropython, 'native'):
+    _native=micropython.native
+else:
+    def _native(f):
+        return f
+
+if hasattr(asyncio, 'sleep_ms'):
+    _sleep_ms=asyncio.sleep_ms
+else:
+    def _sleep_ms(ms):
+        return asyncio.sleep(ms/1000)
+
+def _event_loop():
+    try:
+        return asyncio.get_event_loop()
+    except RuntimeError: #CPython without a current loop
+        loop=asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        return loop
+
+def _heap(collect=False):
+    #used and free bytes of the MicroPython heap, None on other ports
+    #without collect, the used bytes include garbage that was not collected yet
+    if not hasattr(gc, 'mem_alloc'):
+        return (None, None)
+    if collect:
+        gc.collect()
+    return (gc.mem_alloc(), gc.mem_free())
 
 def rgb(r,g,b): #invese color
         return((0xFF-b<<16) + (0xFF-g<<8) + (0xFF-r))
@@ -10,8 +79,783 @@ def rgb(r,g,b): #invese color
 class GuiException(Exception):
     pass
 
+#rectangles are (x1,y1,x2,y2) windows as used by setwin
+def _area(r):
+    return (r[2]-r[0])*(r[3]-r[1])
+
+def _overlaps(a,b):
+    return a[0]<b[2] and b[0]<a[2] and a[1]<b[3] and b[1]<a[3]
+
+def _contains(a,b):#b is completely inside a
+    return a[0]<=b[0] and a[1]<=b[1] and a[2]>=b[2] and a[3]>=b[3]
+
+def _union(a,b):
+    return (min(a[0],b[0]),min(a[1],b[1]),max(a[2],b[2]),max(a[3],b[3]))
+
+def _bisect(a,x):
+    #index of the first element in the sorted list a that is larger than x
+    lo=0
+    hi=len(a)
+    while lo<hi:
+        mid=(lo+hi)//2
+        if x<a[mid]:
+            hi=mid
+        else:
+            lo=mid+1
+    return lo
+
+def _split(start, end, sizes):
+    #integer boundaries for dividing start..end proportionally to sizes
+    total=sum(sizes)
+    ext=end-start
+    cum=0
+    bounds=[]
+    for s in sizes:
+        cum+=s
+        bounds.append(start+ext*cum//total)
+    return bounds
+
+def _intersection_area(a,b):
+    w=min(a[2],b[2])-max(a[0],b[0])
+    h=min(a[3],b[3])-max(a[1],b[1])
+    if w<=0 or h<=0:
+        return 0
+    return w*h
+
+def _intersection(a,b):
+    r=(max(a[0],b[0]),max(a[1],b[1]),min(a[2],b[2]),min(a[3],b[3]))
+    if r[0]>=r[2] or r[1]>=r[3]:
+        return None
+    return r
+
+def rgb565(color):
+    #24 bit color as passed to the display module to RGB565
+    return ((color>>8)&0xF800)|((color>>5)&0x07E0)|((color>>3)&0x001F)
+
+#affine maps are (a,b,c,d,e,f) with x'=a*x+b*y+c and y'=d*x+e*y+f
+def _affine_mul(p,q):
+    #p after q
+    return (p[0]*q[0]+p[1]*q[3], p[0]*q[1]+p[1]*q[4], p[0]*q[2]+p[1]*q[5]+p[2],
+        p[3]*q[0]+p[4]*q[3], p[3]*q[1]+p[4]*q[4], p[3]*q[2]+p[4]*q[5]+p[5])
+
+def _rotation_inv(r):
+    #inverse of a rotation/mirror map, the linear part is orthogonal
+    return (r[0], r[3], -(r[0]*r[2]+r[3]*r[5]), r[1], r[4], -(r[1]*r[2]+r[4]*r[5]))
+
+def solve_affine(raw, points):
+    #least squares affine map from raw touch samples to screen points, 3 or more pairs
+    n=len(raw)
+    if n<3 or n!=len(points):
+        raise GuiException('need at least 3 calibration points')
+    #center the samples, keeps the sums small for single precision floats
+    mx=sum(r[0] for r in raw)/n
+    my=sum(r[1] for r in raw)/n
+    sxx=sxy=syy=0
+    for r in raw:
+        sxx+=(r[0]-mx)**2
+        sxy+=(r[0]-mx)*(r[1]-my)
+        syy+=(r[1]-my)**2
+    det=sxx*syy-sxy*sxy
+    if abs(det)<1e-6*(sxx*syy+1):
+        raise GuiException('calibration points are collinear')
+    m=[]
+    for k in range(2):
+        mp=sum(p[k] for p in points)/n
+        sxp=syp=0
+        for r,p in zip(raw,points):
+            sxp+=(r[0]-mx)*(p[k]-mp)
+            syp+=(r[1]-my)*(p[k]-mp)
+        a=(sxp*syy-syp*sxy)/det
+        b=(syp*sxx-sxp*sxy)/det
+        m+=[a, b, mp-a*mx-b*my]
+    return tuple(m)
+
+#opcodes of recorded drawing primitives
+_RECT=0
+_CIRCLE=1
+_LINE=2
+_TEXT=3
+
+_DL=15 #ints per primitive in a DisplayList: code, box, clip, color, fill, params
+
+@_native
+def _same(a, i, b, j, n):
+    for k in range(n):
+        if a[i+k]!=b[j+k]:
+            return False
+    return True
+
+def _clip_op(op, r):
+    #recorded primitive restricted to the rect r, None if nothing is left
+    box=_intersection(op[1], r)
+    if box is None:
+        return None
+    p=op[5]
+    clip=op[2]
+    if op[0]==_TEXT:
+        if box==op[1]:
+            return op
+        if p[0]<0 or p[1]<0: #aligned by the display module, cannot be moved to another window
+            return None
+        c=_intersection(clip, r)
+        return (_TEXT, box, c, op[3], op[4], (p[0]+clip[0]-c[0], p[1]+clip[1]-c[1], p[2], p[3]))
+    if op[0]==_RECT and op[3]==op[4]: #solid, push the clipped part only
+        p=(box[0],box[1],box[2]-box[0],box[3]-box[1])
+    return (op[0], box, _intersection(clip, r), op[3], op[4], p)
+
+def _move_op(op, dx, dy):
+    #recorded primitive moved by dx,dy
+    b=op[1]
+    c=op[2]
+    p=op[5]
+    if op[0]==_CIRCLE:
+        p=(p[0]+dx,p[1]+dy,p[2])
+    elif op[0]==_RECT:
+        p=(p[0]+dx,p[1]+dy,p[2],p[3])
+    elif op[0]==_LINE:
+        p=(p[0]+dx,p[1]+dy,p[2]+dx,p[3]+dy)
+    return (op[0],(b[0]+dx,b[1]+dy,b[2]+dx,b[3]+dy),(c[0]+dx,c[1]+dy,c[2]+dx,c[3]+dy),op[3],op[4],p)
+
+def _blend(c, bg, e):
+    #color c faded towards bg, e in permille (1000: c)
+    r=0
+    for s in (0,8,16):
+        a=(bg>>s)&0xFF
+        r|=(a+(((c>>s)&0xFF)-a)*e//1000)<<s
+    return r
+
+def _tint_op(op, bg, e):
+    #recorded primitive with its colors faded towards bg
+    p=op[5]
+    if op[0]==_TEXT:
+        p=(p[0],p[1],p[2],_blend(p[3],bg,e))
+    return (op[0],op[1],op[2],_blend(op[3],bg,e),None if op[4] is None else _blend(op[4],bg,e),p)
+
+def _add_rect(rects, r):
+    #add r to a list of damaged rects, unless one of them contains it
+    #overlapping rects are kept apart: each is repainted completely, the union may be much larger
+    i=0
+    while i<len(rects):
+        if _contains(rects[i], r):
+            return
+        if _contains(r, rects[i]):
+            del rects[i]
+        else:
+            i+=1
+    rects.append(r)
+
+class DisplayList:
+    #recorded primitives packed into an array of ints, the strings of the text primitives are kept aside
+    #fill is -1 for outlines, text params are x,y,index of the string,bg
+    __slots__=('ops','strs','n')
+
+    def __init__(self, ops):
+        self.n=n=len(ops)
+        self.ops=a=_zeros('i', _DL*n)
+        self.strs=[]
+        for k in range(n):
+            op=ops[k]
+            i=_DL*k
+            a[i]=op[0]
+            for j in range(4):
+                a[i+1+j]=op[1][j]
+                a[i+5+j]=op[2][j]
+            a[i+9]=op[3]
+            a[i+10]=-1 if op[4] is None else op[4]
+            p=op[5]
+            if op[0]==_TEXT:
+                a[i+11]=p[0]
+                a[i+12]=p[1]
+                a[i+13]=len(self.strs)
+                a[i+14]=p[3]
+                self.strs.append(p[2])
+            else:
+                for j in range(len(p)):
+                    a[i+11+j]=p[j]
+
+    def box(self, k):
+        a=self.ops
+        i=_DL*k
+        return (a[i+1],a[i+2],a[i+3],a[i+4])
+
+    def op(self, k):
+        #primitive k in the format of MicroGUI._record()
+        a=self.ops
+        i=_DL*k
+        if a[i]==_TEXT:
+            p=(a[i+11],a[i+12],self.strs[a[i+13]],a[i+14])
+        elif a[i]==_CIRCLE:
+            p=(a[i+11],a[i+12],a[i+13])
+        else:
+            p=(a[i+11],a[i+12],a[i+13],a[i+14])
+        return (a[i],(a[i+1],a[i+2],a[i+3],a[i+4]),(a[i+5],a[i+6],a[i+7],a[i+8]),a[i+9],None if a[i+10]<0 else a[i+10],p)
+
+    def same(self, k, other, j):
+        a=self.ops
+        b=other.ops
+        i=_DL*k
+        j*=_DL
+        if a[i]!=_TEXT:
+            return _same(a, i, b, j, _DL)
+        return _same(a, i, b, j, 13) and a[i+14]==b[j+14] and self.strs[a[i+13]]==other.strs[b[j+13]]
+
+    def diff(self, old):
+        #primitives to push if old is on screen, clipped to the area that changed
+        #changed primitives are found by matching the unchanged ones at the start and the end
+        n=self.n
+        m=old.n
+        p=0
+        while p<n and p<m and self.same(p, old, p):
+            p+=1
+        if p==n==m:
+            return []
+        s=0
+        while s<n-p and s<m-p and self.same(n-1-s, old, m-1-s):
+            s+=1
+        #the old and new box of each changed primitive are damaged separately, a moved knob does not
+        #damage everything between its two positions
+        dmg=[]
+        if n==m:
+            for k in range(p, n-s):
+                self.changed(k, old, dmg)
+            if not dmg:
+                return []
+        else:
+            for k in range(p, n-s):
+                _add_rect(dmg, self.box(k))
+            for k in range(p, m-s):
+                _add_rect(dmg, old.box(k))
+        #text is not clipped, the area grows to the text touching it
+        a=self.ops
+        grown=True
+        while grown:
+            grown=False
+            for k in range(n):
+                if a[_DL*k]==_TEXT:
+                    b=self.box(k)
+                    for r in dmg:
+                        if _overlaps(b, r) and not _contains(r, b):
+                            dmg.remove(r)
+                            _add_rect(dmg, _union(r, b))
+                            grown=True
+                            break
+        out=[]
+        for r in dmg:
+            #the primitives below the last solid rect covering r are not visible
+            first=0
+            for k in range(n-1, -1, -1):
+                i=_DL*k
+                if a[i]==_RECT and a[i+9]==a[i+10] and _contains(self.box(k), r):
+                    first=k
+                    break
+            for k in range(first, n):
+                if _overlaps(self.box(k), r):
+                    out.append(_clip_op(self.op(k), r))
+        return out
+
+    def changed(self, k, old, dmg):
+        #add the area that looks different if primitive k of old is replaced by primitive k of this list
+        #a solid rect that only grows or shrinks at one edge changes the strip in between
+        a=self.box(k)
+        b=old.box(k)
+        o=self.ops
+        i=_DL*k
+        if o[i]==_RECT and o[i+9]==o[i+10] and o[i]==old.ops[i] and _same(o, i+5, old.ops, i+5, 6):
+            if a==b:
+                return
+            if a[1]==b[1] and a[3]==b[3]:
+                if a[0]==b[0]:
+                    _add_rect(dmg, (min(a[2],b[2]),a[1],max(a[2],b[2]),a[3]))
+                    return
+                if a[2]==b[2]:
+                    _add_rect(dmg, (min(a[0],b[0]),a[1],max(a[0],b[0]),a[3]))
+                    return
+            if a[0]==b[0] and a[2]==b[2]:
+                if a[1]==b[1]:
+                    _add_rect(dmg, (a[0],min(a[3],b[3]),a[2],max(a[3],b[3])))
+                    return
+                if a[3]==b[3]:
+                    _add_rect(dmg, (a[0],min(a[1],b[1]),a[2],max(a[1],b[1])))
+                    return
+        _add_rect(dmg, b)
+        if a!=b:
+            _add_rect(dmg, a)
+
+class LRUCache:
+    #dict with a bounded total size, the least recently used entries are evicted first
+    #a hit only stamps the entry with a use counter, the entries are sorted by it when room is needed
+    #and evicted until the new one fits in low (3/4 of the capacity by default), not sorted on every miss
+    #evict(key, value) is called for entries dropped to make room
+    def __init__(self, capacity, evict=None, low=None):
+        self.capacity=capacity
+        self.evict=evict
+        self.low=capacity*3//4 if low is None else low
+        self.size=0
+        self._data={} #key: [value, size, last use]
+        self._tick=0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        item=self._data.get(key)
+        if item is None:
+            return None
+        self._tick+=1
+        item[2]=self._tick
+        return item[0]
+
+    def put(self, key, value, size=1):
+        self.discard(key)
+        if size>self.capacity:
+            return
+        if self.size+size>self.capacity:
+            self._shrink(max(0, self.low-size))
+        self._tick+=1
+        self._data[key]=[value,size,self._tick]
+        self.size+=size
+
+    def discard(self, key):
+        item=self._data.pop(key, None)
+        if item is not None:
+            self.size-=item[1]
+
+    def clear(self):
+        self._data={}
+        self.size=0
+        self._tick=0
+
+    def sizes(self):
+        #[key, size] pairs, least recently used first
+        return [[k,self._data[k][1]] for k in self._order()]
+
+    def _order(self):
+        data=self._data
+        return sorted(data, key=lambda k: data[k][2])
+
+    def _shrink(self, limit):
+        #evict the least recently used entries until size<=limit, renumber the rest to keep the counter small
+        keys=self._order()
+        i=0
+        while self.size>limit:
+            key=keys[i]
+            i+=1
+            if self.evict is not None:
+                self.evict(key, self._data[key][0])
+            self.discard(key)
+        self._tick=0
+        for key in keys[i:]:
+            self._tick+=1
+            self._data[key][2]=self._tick
+
+def _zeros(typecode, n):
+    #array of n zeros, without a temporary list of n elements
+    a=array(typecode)
+    z=array(typecode, [0]*64)
+    while len(a)+64<=n:
+        a.extend(z)
+    a.extend(array(typecode, [0]*(n-len(a))))
+    return a
+
+class Ring:
+    #fixed size buffer of the last n samples
+    def __init__(self, n, typecode='i'):
+        self.buf=_zeros(typecode, n)
+        self.n=0 #number of samples added
+
+    def append(self, val):
+        self.buf[self.n%len(self.buf)]=val
+        self.n+=1
+
+    def at(self, i):
+        #sample number i, valid for the last len(buf) samples
+        return self.buf[i%len(self.buf)]
+
+    def values(self):
+        if self.n<=len(self.buf):
+            return list(self.buf[:self.n])
+        i=self.n%len(self.buf)
+        return list(self.buf[i:])+list(self.buf[:i])
+
+    def summary(self):
+        vals=self.values()
+        if not vals:
+            return {'n':0}
+        return {'n':self.n, 'last':vals[-1], 'avg':sum(vals)//len(vals), 'max':max(vals)}
+
+PRIMITIVES=('rect','circle','line','text','setwin','blit')
+_SETWIN=4
+_BLIT=5
+
+class Profiler:
+    #render statistics, set MicroGUI.profiler to enable (see MicroGUI.profile())
+    #times are in microseconds
+    def __init__(self, n=64, overlay=False):
+        self.overlay=overlay #show flush statistics in the top right corner
+        self.reset(n)
+
+    def reset(self, n=None):
+        if n is None:
+            n=len(self.flush_time.buf)
+        self.widgets={} #widget: [draws, total time, max time]
+        self.primitives=array('i',[0]*len(PRIMITIVES))
+        self.flush_time=Ring(n)
+        self.flush_pixels=Ring(n)
+        self.touch_latency=Ring(n) #touch sample to the first pixel pushed in response
+        self.loop_lag=Ring(n) #delay of the touch loop wakeup
+        self._touch=None
+
+    def drawn(self, widget, t):
+        rec=self.widgets.get(widget)
+        if rec is None:
+            self.widgets[widget]=[1,t,t]
+        else:
+            rec[0]+=1
+            rec[1]+=t
+            if t>rec[2]:
+                rec[2]=t
+
+    def primitive(self, code, pushed):
+        self.primitives[code]+=1
+        if pushed:
+            self.pushed()
+
+    def pushed(self):
+        #pixels sent to the panel, the first ones after a touch end the touch latency
+        if self._touch is not None:
+            self.touch_latency.append(ticks_diff(ticks_us(), self._touch))
+            self._touch=None
+
+    def touched(self):
+        self._touch=ticks_us()
+
+    def hot_widgets(self, n=5):
+        #widgets with the highest total draw time: (widget, draws, total, max)
+        recs=[(w,)+tuple(r) for w,r in self.widgets.items()]
+        recs.sort(key=lambda r:-r[2])
+        return recs[:n]
+
+    def stats(self):
+        return {'primitives':dict(zip(PRIMITIVES,self.primitives)),
+            'widgets':[('{}@{:x}'.format(type(r[0]).__name__,id(r[0])),r[1],r[2],r[3]) for r in self.hot_widgets()],
+            'flush_time':self.flush_time.summary(),
+            'flush_pixels':self.flush_pixels.summary(),
+            'touch_latency':self.touch_latency.summary(),
+            'loop_lag':self.loop_lag.summary()}
+
+    def draw_overlay(self, screen):
+        prof=screen.profiler
+        ops=screen._ops
+        screen.profiler=None #do not count the overlay itself
+        screen._ops=None #draw directly, also with a framebuffer
+        text='{}ms {}px'.format(self.flush_time.buf[(self.flush_time.n-1)%len(self.flush_time.buf)]//1000,
+            self.flush_pixels.buf[(self.flush_pixels.n-1)%len(self.flush_pixels.buf)])
+        w,h=screen.width, screen.fontSize()[1]+2
+        screen.setwin(w-screen.textWidth(text)-4,0,w-1,h)
+        screen.set_bg(MicroGUI.BLACK)
+        screen.set_fg(MicroGUI.WHITE)
+        screen.clearwin()
+        screen.text(2,1,text)
+        screen.profiler=prof
+        screen._ops=ops
+
+class FrameBuffer:
+    #RGB565 buffer of a fixed number of bytes, holding one band of a region at a time
+    #coordinates are absolute, boxes are half open (x0,y0,x1,y1)
+    def __init__(self, size):
+        self.buf=bytearray(size)
+        self.mv=memoryview(self.buf)
+        self.band=(0,0,0,0)
+        self.clip=self.band
+        self.stride=0
+
+    def rows(self, width):
+        #number of rows of a region with width pixels fitting into the buffer
+        return len(self.buf)//(2*width)
+
+    def begin(self, band):
+        self.band=band
+        self.clip=band
+        self.stride=2*(band[2]-band[0])
+        return self.mv[:self.stride*(band[3]-band[1])]
+
+    def set_clip(self, clip):
+        self.clip=_intersection(self.band, clip) or (0,0,0,0)
+
+    def fill_rect(self,x,y,w,h,c):
+        cl=self.clip
+        x0=max(x,cl[0])
+        x1=min(x+w,cl[2])
+        y0=max(y,cl[1])
+        y1=min(y+h,cl[3])
+        if x0>=x1 or y0>=y1:
+            return
+        n=2*(x1-x0)
+        row=bytes((c>>8,c&0xFF))*(x1-x0)
+        off=(y0-self.band[1])*self.stride+2*(x0-self.band[0])
+        for i in range(y1-y0):
+            self.buf[off:off+n]=row
+            off+=self.stride
+
+    def pixel(self,x,y,c):
+        cl=self.clip
+        if cl[0]<=x<cl[2] and cl[1]<=y<cl[3]:
+            off=(y-self.band[1])*self.stride+2*(x-self.band[0])
+            self.buf[off]=c>>8
+            self.buf[off+1]=c&0xFF
+
+    def line(self,x0,y0,x1,y1,c):
+        if y0==y1:
+            self.fill_rect(min(x0,x1),y0,abs(x1-x0)+1,1,c)
+        elif x0==x1:
+            self.fill_rect(x0,min(y0,y1),1,abs(y1-y0)+1,c)
+        else:#bresenham
+            dx=abs(x1-x0)
+            dy=-abs(y1-y0)
+            sx=1 if x0<x1 else -1
+            sy=1 if y0<y1 else -1
+            err=dx+dy
+            while True:
+                self.pixel(x0,y0,c)
+                if x0==x1 and y0==y1:
+                    break
+                e2=2*err
+                if e2>=dy:
+                    err+=dy
+                    x0+=sx
+                if e2<=dx:
+                    err+=dx
+                    y0+=sy
+
+    def circle(self,cx,cy,r,c,fill=None):
+        x=r
+        y=0
+        err=1-r
+        while x>=y:
+            if fill is not None:
+                self.fill_rect(cx-x,cy+y,2*x+1,1,fill)
+                self.fill_rect(cx-x,cy-y,2*x+1,1,fill)
+                self.fill_rect(cx-y,cy+x,2*y+1,1,fill)
+                self.fill_rect(cx-y,cy-x,2*y+1,1,fill)
+            for px,py in ((x,y),(y,x),(-y,x),(-x,y),(-x,-y),(-y,-x),(y,-x),(x,-y)):
+                self.pixel(cx+px,cy+py,c)
+            y+=1
+            if err<0:
+                err+=2*y+1
+            else:
+                x-=1
+                err+=2*(y-x)+1
+
+
+class HeadlessTFT:
+    #display backend without hardware: renders into an RGB565 buffer, counts the primitives
+    #and models the SPI transfer time of the panel
+    PORTRAIT=0
+    LANDSCAPE=1
+    PORTRAIT_FLIP=2
+    LANDSCAPE_FLIP=3
+    CENTER=-9003
+    RIGHT=-9004
+    BOTTOM=-9004
+    ILI9341=0
+    ILI9488=1
+    ST7789=2
+    ST7735=3
+    TOUCH_NONE=0
+    TOUCH_XPT=1
+    TOUCH_STMPE=2
 
-class MicroGUI(display.TFT): 
+    def __init__(self, spi_hz=40000000, bytes_per_pixel=2, tx_overhead_us=10, char_size=(8,12)):
+        self.spi_hz=spi_hz
+        self.bytes_per_pixel=bytes_per_pixel #on the bus, 3 for ILI9488
+        self.tx_overhead_us=tx_overhead_us #per window/transaction
+        self.char_size=char_size
+        self.native=(240,320)
+        self.rot=self.LANDSCAPE
+        self.fg=0xFFFFFF
+        self.bg=0
+        self.win=(0,0,0,0)
+        self.fb=None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.counts={}
+        self.transactions=0
+        self.spi_bytes=0
+
+    def spi_time(self):
+        #modeled bus time in seconds since reset_stats()
+        return self.spi_bytes*8/self.spi_hz+self.transactions*self.tx_overhead_us/1000000
+
+    def _count(self, name, tx, pixels, extra=0):
+        self.counts[name]=self.counts.get(name,0)+1
+        self.transactions+=tx
+        self.spi_bytes+=tx*11+pixels*self.bytes_per_pixel+extra #11 bytes for CASET, RASET and RAMWR
+
+    def init(self, *args, **kwargs):
+        self.native=(kwargs.get('width',240), kwargs.get('height',320))
+        self.orient(kwargs.get('rot',self.LANDSCAPE))
+
+    def deinit(self):
+        pass
+
+    def orient(self, rot):
+        self.rot=rot
+        self.vscroll=None #[top, height, start] of the scrolling area
+        w,h=self.screensize()
+        self.fb=FrameBuffer(w*h*2)
+        self.fb.begin((0,0,w,h))
+        self.win=(0,0,w-1,h-1)
+
+    def screensize(self):
+        if self.rot in (self.LANDSCAPE, self.LANDSCAPE_FLIP):
+            return (self.native[1], self.native[0])
+        return self.native
+
+    def setwin(self, x1, y1, x2, y2):
+        self._count('setwin',0,0)
+        self.win=(x1,y1,x2,y2)
+
+    def winsize(self):
+        return (self.win[2]-self.win[0]+1, self.win[3]-self.win[1]+1)
+
+    def set_fg(self, color):
+        self.fg=color
+
+    def set_bg(self, color):
+        self.bg=color
+
+    def get_fg(self):
+        return self.fg
+
+    def get_bg(self):
+        return self.bg
+
+    def font(self, *args, **kwargs):
+        pass
+
+    def fontSize(self):
+        return self.char_size
+
+    def textWidth(self, text):
+        return len(text)*self.char_size[0]
+
+    def _clip(self):
+        w=self.win
+        self.fb.set_clip((w[0],w[1],w[2]+1,w[3]+1))
+        return w[0],w[1]
+
+    def pixel(self, x, y, color=None):
+        self._count('pixel',1,1)
+        wx,wy=self._clip()
+        self.fb.pixel(x+wx,y+wy,rgb565(self.fg if color is None else color))
+
+    def rect(self, x, y, w, h, color=None, fill=None):
+        wx,wy=self._clip()
+        if fill is not None:
+            self._count('rect',5,w*h+2*(w+h))
+            self.fb.fill_rect(x+wx,y+wy,w,h,rgb565(fill))
+        else:
+            self._count('rect',4,2*(w+h))
+        c=rgb565(self.fg if color is None else color)
+        x+=wx
+        y+=wy
+        self.fb.fill_rect(x,y,w,1,c)
+        self.fb.fill_rect(x,y+h-1,w,1,c)
+        self.fb.fill_rect(x,y,1,h,c)
+        self.fb.fill_rect(x+w-1,y,1,h,c)
+
+    def circle(self, x, y, r, color=None, fill=None):
+        wx,wy=self._clip()
+        outline=r*710//113
+        if fill is not None:#vertical lines for the fill, single pixels for the outline
+            self._count('circle',2*r+1+outline,r*r*355//113+outline)
+            fill=rgb565(fill)
+        else:
+            self._count('circle',outline,outline)
+        self.fb.circle(x+wx,y+wy,r,rgb565(self.fg if color is None else color),fill)
+
+    def line(self, x, y, x1, y1, color=None):
+        wx,wy=self._clip()
+        n=max(abs(x1-x),abs(y1-y))+1
+        self._count('line',1 if x==x1 or y==y1 else n,n)
+        self.fb.line(x+wx,y+wy,x1+wx,y1+wy,rgb565(self.fg if color is None else color))
+
+    def text(self, x, y, text, color=None):
+        #glyphs are drawn as blocks of the character cell
+        wx,wy=self._clip()
+        cw,ch=self.char_size
+        ww,wh=self.winsize()
+        tw=self.textWidth(text)
+        if x==self.CENTER:
+            x=(ww-tw)//2
+        elif x==self.RIGHT:
+            x=ww-tw
+        if y==self.CENTER:
+            y=(wh-ch)//2
+        elif y==self.BOTTOM:
+            y=wh-ch
+        self._count('text',len(text),len(text)*cw*ch)
+        c=rgb565(self.fg if color is None else color)
+        for i,char in enumerate(text):
+            if char!=' ':
+                self.fb.fill_rect(x+wx+i*cw+1,y+wy+2,cw-2,ch-4,c)
+
+    def clear(self, color=None):
+        w,h=self.screensize()
+        self.win=(0,0,w-1,h-1)
+        self.rect(0,0,w,h,self.bg if color is None else color,self.bg if color is None else color)
+
+    def gettouch(self, raw=False):
+        return (False,0,0)
+
+    def tft_writecmddata(self, cmd, data):
+        #CASET, RASET and RAMWR with RGB565 data as sent by MicroGUI.blit()
+        #VSCRDEF and VSCRSADD scroll the rows of the screen (portrait only)
+        if cmd==0x33:
+            self._count('vscroll',1,0)
+            top=(data[0]<<8)|data[1]
+            self.vscroll=[top, (data[2]<<8)|data[3], top]
+        elif cmd==0x37:
+            self._count('vscroll',1,0)
+            self.vscroll[2]=(data[0]<<8)|data[1]
+        elif cmd==0x2A:
+            self._col=((data[0]<<8)|data[1], (data[2]<<8)|data[3])
+        elif cmd==0x2B:
+            self._row=((data[0]<<8)|data[1], (data[2]<<8)|data[3])
+        elif cmd==0x2C:
+            self._count('blit',1,0,len(data))
+            x0,x1=self._col
+            y0=self._row[0]
+            n=2*(x1-x0+1)
+            fb=self.fb
+            for i in range(len(data)//n):
+                off=(y0+i)*fb.stride+2*x0
+                fb.buf[off:off+n]=data[i*n:(i+1)*n]
+
+    def _row_shown(self, y):
+        #memory row shown at the screen row y
+        if self.vscroll is not None:
+            top,h,start=self.vscroll
+            if top<=y<top+h:
+                return top+(y-top+start-top)%h
+        return y
+
+    def image(self):
+        #RGB565 bytes of the screen as shown, with hardware scrolling applied
+        fb=self.fb
+        if self.vscroll is None:
+            return bytes(fb.buf)
+        return b''.join(bytes(fb.buf[r*fb.stride:(r+1)*fb.stride]) for r in (self._row_shown(y) for y in range(len(fb.buf)//fb.stride)))
+
+    def pixel_at(self, x, y):
+        #RGB565 value of the pixel at x,y
+        off=self._row_shown(y)*self.fb.stride+2*x
+        return (self.fb.buf[off]<<8)|self.fb.buf[off+1]
+
+_TFT=display.TFT if display is not None else HeadlessTFT
+
+class MicroGUI: 
     #define some colors
     RED=rgb(255,0,0)
     GREEN=rgb(0,255,0)
@@ -22,18 +866,92 @@ class MicroGUI(display.TFT):
     BLACK=rgb(0,0,0)
     GRAY=rgb(128,128,128)
     LIGHTGRAY=rgb(211,211,211)
-    halign_const=[0,display.TFT.CENTER,display.TFT.RIGHT]
-    valign_const=[0,display.TFT.CENTER,display.TFT.BOTTOM]
+    halign_const=[0,_TFT.CENTER,_TFT.RIGHT]
+    valign_const=[0,_TFT.CENTER,_TFT.BOTTOM]
     
-    def __init__(self):
-        super().__init__()
-        self.root=Widget([0,0,320,240])
+    def __init__(self, backend=None):
+        #backend is the display driver, display.TFT by default
+        self.tft=backend if backend is not None else _TFT()
+        self.root=Widget()
         self.touched_widget=None
-        self.touch_calibration=(500,3500,500,3500)
+        self.touch_calibration=(500,3500,500,3500) #raw x and y range, used until calibrate_touch()
+        self.touch_affine=None #raw samples to native (portrait) coordinates, see set_touch_calibration()
+        self.touch_cal_file='touch_cal.json' #persisted calibration, None to disable
+        self._touch_maps={} #rotation: Q16 coefficients
+        self._calibrating=False
+        self.scheduler=Scheduler(self) #periodic updates of dynamic widgets
+        self.renderer=Renderer(self) #draws the invalidations, see Renderer.frame()
+        self.animator=Animator(self) #tweens and page transitions
+        self.boot={'first_frame_ms':None, 'heap_used':None, 'heap_free':None} #see boot_info()
+        self.timeline=[] #[phase, ms since the import of microgui], see mark()
+        self.time_source=RtcTime() if RTC is not None else LocalTime()
+        self._backl=None
+        self._backl_ramp=0 #ms to fade in the backlight after the first frame
         self.initiated=0
+        self._root_win=None
+        self.damage=[] #invalid rectangles, repainted by flush()
+        self.dirty=[] #widgets to be updated incrementally by flush() 
+        self.damage_slack=512 #merge two rects if their union adds at most this many pixels
+        self.pixels=0 #pixels written to the panel since start
+        self.flush_stats={'rects':0,'widgets':0,'pixels':0}
+        self.fb=None #FrameBuffer, see enable_framebuffer()
+        self.fb_color=rgb565 #conversion of display colors to the framebuffer format
+        self.fb_stats={'regions':0,'blits':0,'bytes':0,'direct':0}
+        self._ops=None #primitives recorded for the framebuffer
+        self._captures=[] #stack of display lists, see begin_capture()
+        self._hold=0 #record without drawing, see retain()
+        self.lists=None #widget: DisplayList of the rendering on screen, see enable_retained()
+        self.retained_stats={'widgets':0,'unchanged':0,'ops':0,'pushed':0}
+        self.profiler=None #Profiler, see profile()
+        self._font=None #key of the current font for the metrics cache
+        self.text_metrics=LRUCache(256) #(font, text): width
+        self._font_sizes={}
+        self._win=(0,0,0,0) #current window
+        self.touch_source=None #object with gettouch() (and optionally pending()), defaults to the panel
+        self.touch_pending=None #cheap callable, True while the pen is down (e.g. PENIRQ pin)
+        self.touch_fast=10 #sampling period while touched [ms]
+        self.touch_slow=50 #longest sampling period when idle [ms]
+        self.touch_interval=self.touch_fast
+        self.touch_pos=array('h',[0,0]) #last touch position, updated in place
+        self.touch_trail=array('i',[0]*3*8) #ring of the last (x,y,ticks_ms) samples
+        self.touch_count=0 #samples of the current touch
+        self._trail_pos=0
+        self._touch_map=None
+        self.debug=False #print touch events
+        self.touch_wakeups=0 #pen down detected by irq or touch_pending
+        self.touch_samples=0 #calls to gettouch
+        self.touch_polls=0 #iterations of the touch loop
+        self._touch_pin=None
+        self._touch_event=None
+        self._touch_flag=False
+        self._touch_move=False #a move sample in touch_pos waits for the next frame, see _dispatch_move()
         #self.movable=False
     
    
+    def __getattr__(self, name):
+        #constants and methods of the display backend
+        if name=='tft':
+            raise AttributeError(name)
+        return getattr(self.tft, name)
+
+    def screensize(self):
+        return self.tft.screensize()
+
+    def winsize(self):
+        return self.tft.winsize()
+
+    def set_fg(self, color):
+        self.tft.set_fg(color)
+
+    def set_bg(self, color):
+        self.tft.set_bg(color)
+
+    def get_fg(self):
+        return self.tft.get_fg()
+
+    def get_bg(self):
+        return self.tft.get_bg()
+
     @property
     def height(self):
         return self.screensize()[1]
@@ -42,24 +960,64 @@ class MicroGUI(display.TFT):
     def width(self):
         return self.screensize()[0]
 
+    @property
+    def root_win(self):
+        #cached window of the root widget, reset on orientation change
+        if self._root_win is None:
+            self._root_win=(0,0,self.width, self.height)
+        return self._root_win
+
+    def relayout(self):
+        self._root_win=None
+        if self.lists is not None:
+            self.lists.clear()
+        self.root.relayout()
+
     def init(self, *args, **kwargs) :
+        self._backl_ramp=kwargs.pop('backl_ramp', 0) #dark until the first frame is drawn, then fade in
         if 'backl_pin' in kwargs: #interference with TFT, need to remove the parameter from **kwargs dict
             self._backl=PWM(kwargs['backl_pin'])
-            self._backl.duty(100)
+            self._backl.duty(0 if self._backl_ramp else 100)
             del kwargs['backl_pin']
-        kwargs.setdefault('rot',super().LANDSCAPE)
-        super().init(*args, **kwargs)
+        if 'time_source' in kwargs: #e.g. LocalTime() for tests off device
+            self.time_source=kwargs.pop('time_source')
+        if 'touch_irq' in kwargs: #XPT2046 PENIRQ, active low
+            self.set_touch_irq(kwargs['touch_irq'])
+            del kwargs['touch_irq']
+        if 'touch_pending' in kwargs:
+            self.set_touch_pending(kwargs['touch_pending'])
+            del kwargs['touch_pending']
+        if 'touch_cal' in kwargs: #file with the touch calibration
+            self.touch_cal_file=kwargs['touch_cal']
+            del kwargs['touch_cal']
+        fb_size=False
+        if 'fb_size' in kwargs: #bytes of RAM for the framebuffer, None for a full screen buffer
+            fb_size=kwargs['fb_size']
+            del kwargs['fb_size']
+        retained=kwargs.pop('retained', False) #push only changed primitives, see enable_retained()
+        kwargs.setdefault('rot',self.tft.LANDSCAPE)
+        self.tft.init(*args, **kwargs)
         self.rot=kwargs['rot']
+        self.mark('panel')
+        if self.touch_cal_file is None or not self.load_touch_calibration(self.touch_cal_file):
+            self.set_touch_calibration(self._default_calibration(), self.LANDSCAPE_FLIP)
+        self.mark('touch')
+        self._root_win=None
+        self._win=(0,0,self.width-1,self.height-1)
+        if fb_size is not False:
+            self.enable_framebuffer(fb_size)
+        if retained:
+            self.enable_retained()
         self.touch_start=None
         self.touch_current=None
         self.debounce=0
         self.initiated=1
-        loop = asyncio.get_event_loop()
+        loop = _event_loop()
         loop.create_task(self.handle_touch())
 
 
     def  deinit(self):
-        super().deinit()
+        self.tft.deinit()
         self.initiated=False
         #todo: led
 
@@ -68,73 +1026,824 @@ class MicroGUI(display.TFT):
         w,h=self.winsize()
         self.rect(0,0,w,h,self.get_bg(), self.get_bg())
 
+    def setwin(self,x1,y1,x2,y2):
+        if self.profiler is not None:
+            self.profiler.primitive(_SETWIN, False)
+        self._win=(x1,y1,x2,y2)
+        self.tft.setwin(x1,y1,x2,y2)
+
+    def setbox(self, box):
+        #set the window to a widget box, boxes exclude their right and bottom edge
+        self.setwin(box[0],box[1],box[2]-1,box[3]-1)
+
+    #drawing primitives count the pixels they push to the panel
+    #with a framebuffer they are recorded and pushed on flush
+    def rect(self,x,y,w,h,*args):
+        if self.profiler is not None:
+            self.profiler.primitive(_RECT, self._ops is None and not self._captures)
+        if self._ops is not None or self._captures:
+            wx,wy=self._win[0],self._win[1]
+            if self._record(_RECT,(x+wx,y+wy,x+wx+w,y+wy+h),args,(x+wx,y+wy,w,h)):
+                return
+        self.pixels+=w*h
+        self.tft.rect(x,y,w,h,*args)
+
+    def circle(self,x,y,r,*args):
+        if self.profiler is not None:
+            self.profiler.primitive(_CIRCLE, self._ops is None and not self._captures)
+        if self._ops is not None or self._captures:
+            wx,wy=self._win[0],self._win[1]
+            if self._record(_CIRCLE,(x+wx-r,y+wy-r,x+wx+r+1,y+wy+r+1),args,(x+wx,y+wy,r)):
+                return
+        if len(args)>1:#filled
+            self.pixels+=r*r*355//113
+        else:
+            self.pixels+=r*710//113
+        self.tft.circle(x,y,r,*args)
+
+    def line(self,x,y,x1,y1,*args):
+        if self.profiler is not None:
+            self.profiler.primitive(_LINE, self._ops is None and not self._captures)
+        if self._ops is not None or self._captures:
+            wx,wy=self._win[0],self._win[1]
+            if self._record(_LINE,(min(x,x1)+wx,min(y,y1)+wy,max(x,x1)+wx+1,max(y,y1)+wy+1),args,(x+wx,y+wy,x1+wx,y1+wy)):
+                return
+        self.pixels+=max(abs(x1-x),abs(y1-y))+1
+        self.tft.line(x,y,x1,y1,*args)
+
+    def text(self,x,y,text,*args):
+        if self.profiler is not None:
+            self.profiler.primitive(_TEXT, self._ops is None and not self._captures)
+        #with a framebuffer text is rendered by the display module on top of the blits
+        if self._ops is not None or self._captures:
+            win=self._win
+            if x>=0 and y>=0: #not aligned by the display module (CENTER, RIGHT, ...)
+                box=(win[0]+x,win[1]+y,win[0]+x+self.textWidth(text),win[1]+y+self.fontSize()[1])
+            else:
+                box=(win[0],win[1],win[2]+1,win[3]+1)
+            if self._record(_TEXT,box,args,(x,y,text,self.get_bg())):
+                return
+        self.pixels+=self.textWidth(text)*self.fontSize()[1]
+        self.tft.text(x,y,text,*args)
+
+    def font(self, font, *args, **kwargs):
+        self._font=(font,)+args+tuple(sorted(kwargs.items()))
+        self.tft.font(font, *args, **kwargs)
+
+    #text metrics are cached per font
+    def textWidth(self, text):
+        key=(self._font, text)
+        w=self.text_metrics.get(key)
+        if w is None:
+            w=self.tft.textWidth(text)
+            self.text_metrics.put(key, w)
+        return w
+
+    def fontSize(self):
+        size=self._font_sizes.get(self._font)
+        if size is None:
+            size=self._font_sizes[self._font]=self.tft.fontSize()
+        return size
+
+    def text_box(self, halign, valign, text):
+        #position and size (x,y,w,h) of aligned text in the current window
+        w=self.textWidth(text)
+        h=self.fontSize()[1]
+        ww,wh=self.winsize()
+        return ((ww-w)*halign//2, (wh-h)*valign//2, w, h)
+
+    def text_delta(self, x, y, old, new, bg):
+        #redraw the part of new that differs from old, both drawn at x,y in the current window
+        #the text behind the change is kept if it does not move, returns the number of characters drawn
+        n=min(len(old),len(new))
+        i=0
+        while i<n and old[i]==new[i]:
+            i+=1
+        if i==len(old)==len(new):
+            return 0
+        j=0
+        while j<n-i and old[len(old)-1-j]==new[len(new)-1-j]:
+            j+=1
+        w_old=self.textWidth(old[i:len(old)-j])
+        if w_old!=self.textWidth(new[i:len(new)-j]):
+            j=0 #the tail moves
+            w_old=self.textWidth(old[i:])
+        part=new[i:len(new)-j]
+        x+=self.textWidth(new[:i])
+        self.rect(x,y,max(w_old,self.textWidth(part)),self.fontSize()[1],bg,bg)
+        self.text(x,y,part)
+        return len(part)
+
+    def enable_framebuffer(self, size=None):
+        #draw into RAM and push modified regions in bulk writes on flush()
+        #size of the buffer in bytes, default is the full screen, smaller buffers are filled band by band
+        if size is None:
+            size=self.width*self.height*2
+        if size<self.width*2:
+            raise GuiException('framebuffer of {} bytes does not hold a single row'.format(size))
+        self.fb=FrameBuffer(size)
+        self._ops=[]
+
+    def disable_framebuffer(self):
+        self.flush_framebuffer()
+        self.fb=None
+        self._ops=None
+
+    def _record(self, code, box, args, params):
+        #box is the bounding box of the primitive, clipped to the current window
+        #returns True if the primitive must not be drawn directly
+        win=self._win
+        clip=(win[0],win[1],win[2]+1,win[3]+1)
+        box=_intersection(box, clip)
+        if box is None:
+            return True
+        color=args[0] if len(args)>0 else self.get_fg()
+        fill=args[1] if len(args)>1 else None
+        op=(code, box, clip, color, fill, params)
+        if self._captures:
+            self._captures[-1].append(op)
+        if self._hold:
+            return True
+        if self._ops is not None:
+            self._ops.append(op)
+            return True
+        return False
+
+    def begin_capture(self):
+        #record the following primitives into a display list, captures can be nested
+        self._captures.append([])
+
+    def end_capture(self):
+        ops=self._captures.pop()
+        if self._captures:
+            self._captures[-1].extend(ops)
+        return ops
+
+    def replay(self, ops):
+        #draw a display list returned by end_capture()
+        if self._captures:
+            self._captures[-1].extend(ops)
+        if self._ops is not None:
+            self._ops.extend(ops)
+            return
+        for op in ops:
+            self._draw_op(op)
+        self.tft.setwin(*self._win)
+
+    def enable_retained(self):
+        #keep a display list of each widget and push only the primitives that changed on redraws
+        self.lists={}
+
+    def disable_retained(self):
+        self.lists=None
+
+    def retain(self, widget, win):
+        #draw the widget into a display list, push the difference to its last rendering
+        self._captures.append([])
+        self._hold+=1
+        try:
+            widget.draw(self, win)
+        finally:
+            self._hold-=1
+            ops=self._captures.pop()
+        if self._captures: #e.g. the page cache of a Menue gets the complete rendering
+            self._captures[-1].extend(ops)
+        new=DisplayList(ops)
+        old=self.lists.get(widget)
+        self.lists[widget]=new
+        stats=self.retained_stats
+        stats['widgets']+=1
+        stats['ops']+=len(ops)
+        if old is not None:
+            ops=new.diff(old)
+            if not ops:
+                stats['unchanged']+=1
+                return
+        stats['pushed']+=len(ops)
+        self._push(ops)
+
+    def record(self, widget, win):
+        #primitives of the widget drawn in win, without drawing them
+        #blit() and hardware scrolling are suppressed as well, FotoFrame records its background only
+        #and ListView the visible rows at their screen position
+        self._captures.append([])
+        self._hold+=1
+        lists=self.lists
+        self.lists=None #no diffing, the rendering goes elsewhere
+        try:
+            widget.draw(self, win)
+        finally:
+            self._hold-=1
+            self.lists=lists
+            ops=self._captures.pop()
+        return ops
+
+    def draw_clipped(self, widget, win, clip):
+        #draw the part of the widget in win that lies within clip, e.g. a row scrolled partly out of a list
+        ops=[op for op in (_clip_op(op, clip) for op in self.record(widget, win)) if op is not None]
+        if self._captures:
+            self._captures[-1].extend(ops)
+        self._push(ops)
+
+    def _push(self, ops):
+        #draw recorded primitives
+        if self._hold: #recording, e.g. a row drawn by draw_clipped() within record()
+            return
+        if self._ops is not None:
+            self._ops.extend(ops)
+            return
+        for op in ops:
+            self._draw_op(op)
+        if self.profiler is not None:
+            self.profiler.pushed()
+        self.tft.setwin(*self._win)
+
+    def vscroll_define(self, win):
+        #set up hardware scrolling of the rows of win, False if the panel cannot scroll it
+        #the panel scrolls full rows of its native (portrait) orientation, not while recording
+        if self._hold or self.rot!=self.PORTRAIT or win[0]!=0 or win[2]!=self.width or not hasattr(self.tft, 'tft_writecmddata'):
+            return False
+        top=win[1]
+        h=win[3]-win[1]
+        bottom=self.height-win[3]
+        self.tft_writecmddata(0x33, bytearray((top>>8,top&0xFF,h>>8,h&0xFF,bottom>>8,bottom&0xFF))) #VSCRDEF
+        self.vscroll(top)
+        return True
+
+    def vscroll(self, start):
+        #show the panel memory row start at the top of the scrolling area
+        if self._hold:
+            return
+        self.tft_writecmddata(0x37, bytearray((start>>8,start&0xFF))) #VSCRSADD
+
+    def blit(self, x, y, w, h, data):
+        #write RGB565 pixels to the window x,y,w,h of the panel
+        if self._hold:
+            return
+        x1=x+w-1
+        y1=y+h-1
+        self.tft_writecmddata(0x2A, bytearray((x>>8,x&0xFF,x1>>8,x1&0xFF)))
+        self.tft_writecmddata(0x2B, bytearray((y>>8,y&0xFF,y1>>8,y1&0xFF)))
+        self.tft_writecmddata(0x2C, data)
+        if self.profiler is not None:
+            self.profiler.primitive(_BLIT, True)
+        self.fb_stats['blits']+=1
+        self.fb_stats['bytes']+=len(data)
+
+    def flush_framebuffer(self):
+        #rasterize the recorded primitives and push them, returns the number of pixels pushed
+        ops=self._ops
+        if not ops:
+            return 0
+        self._ops=[]
+        self.fb_stats['blits']=self.fb_stats['bytes']=0
+        fb=self.fb
+        color=self.fb_color
+        #filled rects define the opaque regions that are completely rendered in RAM
+        opaque=[(i,op[1]) for i,op in enumerate(ops) if op[0]==_RECT and op[4] is not None]
+        regions=[]
+        for i,box in opaque:
+            for reg in regions:
+                if _contains(reg,box):
+                    break
+            else:
+                regions=[reg for reg in regions if not _contains(box,reg)]
+                regions.append(box)
+        #join regions tiling a rectangle, e.g. the widgets of a frame, into one write
+        i=0
+        while i<len(regions):
+            a=regions[i]
+            for j in range(i+1,len(regions)):
+                b=regions[j]
+                u=_union(a,b)
+                if _area(u)==_area(a)+_area(b) and not _intersection_area(a,b):
+                    regions[i]=u
+                    del regions[j]
+                    break
+            else:
+                i+=1
+        #text and primitives outside the opaque regions go directly to the panel
+        #primitives painted over by a later opaque rect go first, the blit restores the covered part
+        direct=0
+        late=[]
+        for i,op in enumerate(ops):
+            covered=False
+            if op[0]==_TEXT:#overwritten later
+                for j,box in opaque:
+                    if j>i and _contains(box,op[1]):
+                        covered=True
+                        break
+            else:
+                for reg in regions:
+                    if _contains(reg,op[1]):
+                        covered=True
+                        break
+            if covered:
+                continue
+            direct+=1
+            if op[0]!=_TEXT:
+                for j,box in opaque:
+                    if j>i and _overlaps(box,op[1]):
+                        self._draw_op(op)
+                        break
+                else:
+                    late.append(op)
+            else:
+                late.append(op)
+        pixels=0
+        for reg in regions:
+            w=reg[2]-reg[0]
+            rows=fb.rows(w)
+            y=reg[1]
+            while y<reg[3]:
+                h=min(rows,reg[3]-y)
+                band=(reg[0],y,reg[2],y+h)
+                data=fb.begin(band)
+                for op in ops:
+                    if op[0]!=_TEXT and _overlaps(op[1],band):
+                        fb.set_clip(op[2])
+                        fill=None if op[4] is None else color(op[4])
+                        p=op[5]
+                        if op[0]==_RECT:
+                            if fill is not None:
+                                fb.fill_rect(p[0],p[1],p[2],p[3],fill)
+                            c=color(op[3])
+                            fb.fill_rect(p[0],p[1],p[2],1,c)
+                            fb.fill_rect(p[0],p[1]+p[3]-1,p[2],1,c)
+                            fb.fill_rect(p[0],p[1],1,p[3],c)
+                            fb.fill_rect(p[0]+p[2]-1,p[1],1,p[3],c)
+                        elif op[0]==_CIRCLE:
+                            fb.circle(p[0],p[1],p[2],color(op[3]),fill)
+                        elif op[0]==_LINE:
+                            fb.line(p[0],p[1],p[2],p[3],color(op[3]))
+                self.blit(reg[0],y,w,h,data)
+                y+=h
+            pixels+=_area(reg)
+        for op in late:
+            self._draw_op(op)
+        self.fb_stats['regions']=len(regions)
+        self.fb_stats['direct']=direct
+        self.tft.setwin(*self._win)
+        self.pixels+=pixels
+        return pixels
+
+    def _draw_op(self, op):
+        clip=op[2]
+        self.tft.setwin(clip[0],clip[1],clip[2]-1,clip[3]-1)
+        p=op[5]
+        if op[0]==_TEXT:
+            self.pixels+=self.textWidth(p[2])*self.fontSize()[1]
+            self.tft.set_bg(p[3])
+            self.tft.text(p[0],p[1],p[2],op[3])
+            return
+        if op[0]==_RECT:
+            self.pixels+=p[2]*p[3]
+            if op[4] is None:
+                self.tft.rect(p[0]-clip[0],p[1]-clip[1],p[2],p[3],op[3])
+            else:
+                self.tft.rect(p[0]-clip[0],p[1]-clip[1],p[2],p[3],op[3],op[4])
+        elif op[0]==_CIRCLE:
+            self.pixels+=_area(op[1])
+            if op[4] is None:
+                self.tft.circle(p[0]-clip[0],p[1]-clip[1],p[2],op[3])
+            else:
+                self.tft.circle(p[0]-clip[0],p[1]-clip[1],p[2],op[3],op[4])
+        elif op[0]==_LINE:
+            self.pixels+=max(abs(p[2]-p[0]),abs(p[3]-p[1]))+1
+            self.tft.line(p[0]-clip[0],p[1]-clip[1],p[2]-clip[0],p[3]-clip[1],op[3])
+
+    def invalidate(self, win):
+        #add win to the damaged area, merging it with overlapping or nearby rects
+        r=(win[0],win[1],win[2],win[3])
+        i=0
+        while i<len(self.damage):
+            d=self.damage[i]
+            u=_union(d,r)
+            if _area(u)-_area(d)-_area(r)+_intersection_area(d,r)<=self.damage_slack:
+                del self.damage[i]
+                r=u
+                i=0
+            else:
+                i+=1
+        self.damage.append(r)
+        self.renderer.request()
+
+    def update(self, widget):
+        #widget.refresh() will be called with the next flush, unless the widget gets redrawn anyway
+        if widget not in self.dirty:
+            self.dirty.append(widget)
+        self.renderer.request()
+
+    def profile(self, on=True, overlay=False):
+        #switch render statistics on or off, returns the Profiler
+        if on:
+            if self.profiler is None:
+                self.profiler=Profiler()
+            self.profiler.overlay=overlay
+        else:
+            self.profiler=None
+        return self.profiler
+
+    def flush(self):
+        #repaint the widgets within the damaged rects, returns the number of pixels pushed
+        if not self.damage and not self.dirty and not self._ops:
+            return 0
+        prof=self.profiler
+        if prof is not None:
+            t=ticks_us()
+        rects=self.damage
+        dirty=self.dirty
+        self.damage=[]
+        self.dirty=[]
+        start=self.pixels
+        n=self.root.repaint(self,self.root_win, rects) if rects else 0
+        for w in dirty:
+            if w.is_visible:
+                for r in rects:
+                    if _contains(r,w.win):
+                        break
+                else:
+                    if prof is not None:
+                        t0=ticks_us()
+                    w.refresh()
+                    if self.lists is not None: #the incremental update is not in the display list
+                        w.forget()
+                    if prof is not None:
+                        prof.drawn(w, ticks_diff(ticks_us(),t0))
+                    n+=1
+        self.flush_stats['widgets']=n
+        if self.fb is not None:
+            self.flush_framebuffer()
+        self.flush_stats['rects']=len(rects)
+        self.flush_stats['pixels']=self.pixels-start
+        if prof is not None:
+            prof.flush_time.append(ticks_diff(ticks_us(),t))
+            prof.flush_pixels.append(self.flush_stats['pixels'])
+            if prof.overlay:
+                prof.draw_overlay(self)
+        return self.flush_stats['pixels']
+
+    def set_touch_irq(self, pin):
+        #wake the touch loop on the falling edge of the PENIRQ pin
+        if not hasattr(pin, 'irq'):
+            pin=Pin(pin, Pin.IN, Pin.PULL_UP)
+        self._touch_pin=pin
+        self.touch_pending=lambda: pin.value()==0
+        self.touch_slow=1000
+        if hasattr(asyncio, 'ThreadSafeFlag'):
+            self._touch_event=asyncio.ThreadSafeFlag()
+        else:
+            self._touch_event=None
+        pin.irq(trigger=Pin.IRQ_FALLING, handler=self._touch_irq)
+
+    def set_touch_pending(self, pending):
+        #pending() is polled instead of the (slow) touch controller while idle
+        self.touch_pending=pending
+        self.touch_slow=100
+
+    def _touch_irq(self, pin):
+        self._touch_flag=True
+        self.touch_wakeups+=1
+        if self._touch_event is not None:
+            self._touch_event.set()
+
+    @property
+    def touch_rate(self):
+        #current sampling rate [Hz]
+        return 1000/self.touch_interval
+
+    def touch_info(self):
+        return {'rate':self.touch_rate, 'wakeups':self.touch_wakeups, 'samples':self.touch_samples, 'polls':self.touch_polls}
+
+    def touch_velocity(self, n=4):
+        #pen speed [px/s] over the last n samples of the trail, (0,0) if unknown
+        n=min(n, self.touch_count, len(self.touch_trail)//3)
+        if n<2:
+            return (0,0)
+        tr=self.touch_trail
+        size=len(tr)
+        i=(self._trail_pos-3)%size
+        j=(self._trail_pos-3*n)%size
+        dt=ticks_diff(tr[i+2],tr[j+2])
+        if dt<=0:
+            return (0,0)
+        return ((tr[i]-tr[j])*1000//dt, (tr[i+1]-tr[j+1])*1000//dt)
+
+    def _native_size(self):
+        w,h=self.screensize()
+        if self.rot in (self.LANDSCAPE, self.LANDSCAPE_FLIP):
+            return (h,w)
+        return (w,h)
+
+    def _rotation(self, rot):
+        #map from native (portrait) coordinates to the screen coordinates of rot
+        #if the panel rotates the other way, swap the LANDSCAPE entries
+        w,h=self._native_size()
+        if rot==self.LANDSCAPE:
+            return (0,1,0, -1,0,w-1)
+        if rot==self.PORTRAIT_FLIP:
+            return (-1,0,w-1, 0,-1,h-1)
+        if rot==self.LANDSCAPE_FLIP:
+            return (0,-1,h-1, 1,0,0)
+        return (1,0,0, 0,1,0)
+
+    def _default_calibration(self):
+        #the linear raw ranges of touch_calibration, in LANDSCAPE_FLIP coordinates
+        cal=self.touch_calibration
+        h,w=self._native_size()
+        sx=w/(cal[1]-cal[0])
+        sy=h/(cal[3]-cal[2])
+        return (sx,0,-cal[0]*sx, 0,-sy,h+cal[2]*sy)
+
+    def set_touch_calibration(self, m, rot=None):
+        #m maps raw samples to the screen coordinates of rot (default: current orientation)
+        #the fixed point maps for all orientations are computed here, orient() only switches
+        if rot is None:
+            rot=self.rot
+        self.touch_affine=_affine_mul(_rotation_inv(self._rotation(rot)), m)
+        self._touch_maps={}
+        for r in (self.PORTRAIT, self.LANDSCAPE, self.PORTRAIT_FLIP, self.LANDSCAPE_FLIP):
+            q=_affine_mul(self._rotation(r), self.touch_affine)
+            w,h=self._native_size()
+            if r in (self.LANDSCAPE, self.LANDSCAPE_FLIP):
+                w,h=h,w
+            #Q16, rounding is folded into the offsets
+            self._touch_maps[r]=array('i',[int(round(q[0]*65536)), int(round(q[1]*65536)), int(round(q[2]*65536))+32768,
+                int(round(q[3]*65536)), int(round(q[4]*65536)), int(round(q[5]*65536))+32768, w, h])
+        self._touch_setup()
+
+    def save_touch_calibration(self, path=None):
+        with open(path or self.touch_cal_file, 'w') as f:
+            json.dump({'affine':list(self.touch_affine)}, f)
+
+    def load_touch_calibration(self, path=None):
+        #returns False if there is no stored calibration
+        try:
+            with open(path or self.touch_cal_file) as f:
+                m=json.load(f)['affine']
+        except (OSError, ValueError, KeyError):
+            return False
+        self.set_touch_calibration(m, self.PORTRAIT)
+        return True
+
+    def _touch_setup(self):
+        self._touch_map=self._touch_maps[self.rot]
+
+    def _read_touch(self, pos):
+        #calibrated panel sample into pos, returns the touch state
+        t,y,x=self.tft.gettouch(raw=True)
+        if not t:
+            return False
+        m=self._touch_map
+        sx=(m[0]*x+m[1]*y+m[2])>>16
+        sy=(m[3]*x+m[4]*y+m[5])>>16
+        if sx<0 or sx>=m[6] or sy<0 or sy>=m[7]: #maybe better return extremes
+            return False
+        pos[0]=sx
+        pos[1]=sy
+        return True
+
+    def _process_touch(self, defer=False):
+        #read and dispatch one sample, does not allocate while the pen moves
+        #with defer, a move is left in touch_pos for the next frame: only the latest one is dispatched
+        pos=self.touch_pos
+        src=self.touch_source
+        if src is None:
+            t=self._read_touch(pos)
+        else:
+            t,x,y=src.gettouch()
+            if t:
+                pos[0]=x
+                pos[1]=y
+        self.touch_samples+=1
+        if t:
+            tr=self.touch_trail
+            i=self._trail_pos
+            tr[i]=pos[0]
+            tr[i+1]=pos[1]
+            tr[i+2]=ticks_ms()
+            self._trail_pos=(i+3)%len(tr)
+            self.touch_count+=1
+            if self.profiler is not None:
+                self.profiler.touched()
+        if t and self.touch_start is None: #touch_down
+            #if self.debounce<1: #false positive are rare, no debounce
+            #    self.debounce+=1
+            #else:
+                if self.debug:
+                    print('touch at ({},{})'.format(pos[0],pos[1]))
+                self.touch_start=(pos[0],pos[1])
+                self.touch_current=pos
+                self.touch_count=1
+                self.touched_widget,self.touch_window =self.root.on_touch(pos, self.root_win, self)
+                self.debounce=0
+        elif t:#touch_move
+            #if self.touched_widget.is_movable: #this is set by the widget at touch_down
+            self._touch_move=True
+            if not defer:
+                self._dispatch_move()
+        elif self.touch_start is not None:#touch release, pos holds the last position
+            self._dispatch_move()
+            if self.debounce<1:
+                self.debounce+=1
+            else:
+                if self.debug:
+                    print('release at ({},{})'.format(pos[0],pos[1]))
+                #self.movable=False
+                self.touched_widget.on_release(pos, self.touch_window, self)
+                self.touch_start=None
+                self.touch_current=None
+                self.debounce=0
+        return t
+
+    def _dispatch_move(self):
+        if self._touch_move:
+            self._touch_move=False
+            self.touched_widget.on_move(self.touch_pos, self.touch_window, self)
+
+    def check_touch_alloc(self, n=16):
+        #raise GuiException if processing touch samples allocates (MicroPython only)
+        #call while the pen is held down; the loboris driver allocates the tuple returned by
+        #gettouch, so use a ScriptedTouch source to check the path behind the driver
+        if micropython is None or not hasattr(micropython,'heap_lock'):
+            raise GuiException('micropython.heap_lock is not available')
+        for i in range(3): #touch down and the first moves may grow lists
+            self._process_touch()
+        micropython.heap_lock()
+        try:
+            while n>0:
+                self._process_touch()
+                n-=1
+        except MemoryError:
+            pass
+        finally:
+            micropython.heap_unlock()
+        if n>0:
+            raise GuiException('touch input path allocates')
+
+    async def _touch_wait(self, interval):
+        if self._touch_pin is None or self.touch_start is not None:
+            if self.profiler is None:
+                await _sleep_ms(interval)
+            else:
+                t=ticks_ms()
+                await _sleep_ms(interval)
+                self.profiler.loop_lag.append(max(0,ticks_diff(ticks_ms(),t)-interval)*1000)
+        elif self._touch_event is not None:
+            try:
+                await asyncio.wait_for(self._touch_event.wait(), interval/1000)
+            except asyncio.TimeoutError:
+                pass
+        else:#no way to wake the loop from the irq, check the flag at the fast rate
+            while interval>0 and not self._touch_flag:
+                await _sleep_ms(self.touch_fast)
+                interval-=self.touch_fast
+
     async def handle_touch(self):
         while self.initiated:
-            t,x, y=self.gettouch()
-            if t and self.touch_start is None: #touch_down
-                #if self.debounce<1: #false positive are rare, no debounce
-                #    self.debounce+=1
-                #else:
-                    print('touch at ({},{})'.format(x,y))
-                    self.touch_start=x,y
-                    self.touch_current=x,y
-                    self.touched_widget,self.touch_window =self.root.on_touch((x,y), (0,0,self.width, self.height), self)
-                    self.debounce=0                
-            elif t and self.touch_start is not None:#touch_move
-                self.touch_current=(x,y)
-                #if self.touched_widget.is_movable: #this is set by the widget at touch_down
-                #self.touched_widget.on_move((x-self.touch_window[0], y-self.touch_window[1]), self.touch_window)
-                self.touched_widget.on_move(self.touch_current, self.touch_window, self)
-            elif not t and self.touch_start is not None:#touch release
-                if self.debounce<1:
-                    self.debounce+=1
+            if self._calibrating: #calibrate_touch() reads the panel
+                await _sleep_ms(self.touch_slow)
+                continue
+            self.touch_polls+=1
+            if self.touch_start is None and not self._touch_flag and self.touch_pending is not None and not self.touch_pending():
+                #idle, nothing to read from the touch controller
+                self.touch_interval=min(self.touch_interval*2, self.touch_slow)
+            else:
+                if self.touch_start is None and self._touch_pin is None and self.touch_pending is not None:
+                    self.touch_wakeups+=1
+                self._touch_flag=False
+                if self._process_touch(True) or self.touch_start is not None:
+                    self.touch_interval=self.touch_fast
                 else:
-                    print('release at ({},{})'.format(*self.touch_current))
-                    #self.movable=False
-                    self.touched_widget.on_release(self.touch_current, self.touch_window, self)
-                    self.touch_start=None
-                    self.touch_current=None
-                    self.debounce=0    
-            await asyncio.sleep(0.05)  
+                    self.touch_interval=min(self.touch_interval*2, self.touch_slow)
+                if self._touch_move:
+                    self.renderer.request()
+                else:
+                    self.renderer.input()
+            await self._touch_wait(self.touch_interval)
 
 
     def backlight(self, *arg):
         return self._backl.duty(*arg) 
 
+    async def ramp_backlight(self, duty=100, ms=300):
+        #fade the backlight in, e.g. after the first frame
+        if self._backl is None:
+            return
+        steps=max(1, ms//20)
+        for i in range(1, steps+1):
+            self._backl.duty(duty*i//steps)
+            await _sleep_ms(ms//steps)
+
     def orient(self, rot=None):
         if rot is not None:
-            super().orient(rot)
+            self.tft.orient(rot)
             self.rot=rot
+            self._touch_setup()
+            self.relayout()
         return self.rot
 
-    def calibrate_touch(self):
-        raise NotImplementedError
-        #todo:calibration
+    async def calibrate_touch(self, points=5, samples=8, save=True):
+        #touch the targets, 3 points fit the affine map exactly, 5 average out the noise
+        w,h=self.screensize()
+        mx=w//8
+        my=h//8
+        targets=[(mx,my),(w-1-mx,my),(w-1-mx,h-1-my),(mx,h-1-my),(w//2,h//2)][:points]
+        raw=[]
+        self._calibrating=True
+        try:
+            for x,y in targets:
+                self._draw_target(x,y)
+                raw.append(await self._raw_press(samples))
+        finally:
+            self._calibrating=False
+        self.set_touch_calibration(solve_affine(raw, targets))
+        if save and self.touch_cal_file is not None:
+            self.save_touch_calibration()
+        self.draw()
+
+    def _draw_target(self, x, y):
+        w,h=self.screensize()
+        self.setwin(0,0,w-1,h-1)
+        self.rect(0,0,w,h,self.BLACK,self.BLACK)
+        self.line(x-10,y,x+10,y,self.WHITE)
+        self.line(x,y-10,x,y+10,self.WHITE)
+        self.circle(x,y,5,self.RED)
+        if self.fb is not None:
+            self.flush_framebuffer()
+
+    async def _raw_press(self, n):
+        #median of n raw samples of one press, returns after the release
+        xs=[]
+        ys=[]
+        while len(xs)<n:
+            t,y,x=self.tft.gettouch(raw=True)
+            if t:
+                xs.append(x)
+                ys.append(y)
+            await _sleep_ms(self.touch_fast)
+        while self.tft.gettouch(raw=True)[0]:
+            await _sleep_ms(self.touch_fast)
+        xs.sort()
+        ys.sort()
+        return (xs[n//2], ys[n//2])
 
     def gettouch(self,raw=False):
-        cal=self.touch_calibration
-        res=self.screensize()
-        t,y,x=super().gettouch(raw=True)
         if raw:
+            t,y,x=self.tft.gettouch(raw=True)
             return(t,x,y)
-        if not t or x<cal[0] or x>cal[1] or y<cal[2] or y>cal[3]: #maybe better return extremes
+        pos=array('h',[0,0])
+        if not self._read_touch(pos):
             return False,0,0
-        #do calibration
-        x=((x-cal[0])/(cal[1]-cal[0]))*res[0]
-        y=((y-cal[2])/(cal[3]-cal[2]))*res[1]
-        if self.orient() in [super().PORTRAIT,super().PORTRAIT_FLIP]: 
-            (x,y)=(y,x)
-        if self.orient() in [super().LANDSCAPE_FLIP,super().PORTRAIT_FLIP]:
-            y=res[1]-y
-        return(t,int(x),int(y))
+        return(True,pos[0],pos[1])
 
     def draw(self):
-        self.root.draw(self, (0,0,self.width, self.height) )
+        first=self.boot['first_frame_ms'] is None
+        if first:
+            self.mark('tree')
+        if self.lists is not None: #everything is pushed again
+            self.lists.clear()
+        self.invalidate(self.root_win)
+        self.flush()
+        if first:
+            self.boot['first_frame_ms']=self.mark('first_frame')
+            self.boot['heap_used'],self.boot['heap_free']=_heap(self.debug) #a full collection only for the debug print
+
+    def mark(self, phase):
+        #add phase to the boot timeline, returns the ms since the import of microgui
+        ms=ticks_diff(ticks_ms(),_BOOT)
+        self.timeline.append([phase, ms])
+        return ms
+
+    def background(self, phase, coro):
+        #run slow initialisation as a task, phase is marked in the timeline when it is done
+        async def run():
+            await coro
+            self.mark(phase)
+        _event_loop().create_task(run())
+
+    def boot_info(self):
+        #time from importing microgui to the first frame, the heap after it (not collected unless debug)
+        #and the timeline of the phases
+        info=dict(self.boot)
+        info['timeline']=[list(t) for t in self.timeline]
+        return info
     
-    def mainloop(self):
+    def start(self):
+        #first frame, then the slow parts in the background
         self.draw()
+        if self._backl_ramp:
+            self.background('backlight', self.ramp_backlight(100, self._backl_ramp))
+        if not self.time_source.synced:
+            self.background('time', self.time_source.sync())
+        if self.debug:
+            print('first frame after {first_frame_ms} ms, heap used {heap_used}, free {heap_free}'.format(**self.boot))
+            print('boot timeline [ms]: '+', '.join('{} {}'.format(*t) for t in self.timeline))
+
+    def mainloop(self):
+        self.start()
         #start async loop for touch
-        loop = asyncio.get_event_loop()
+        loop = _event_loop()
         try: 
             loop.run_forever()
         except Exception as e:
@@ -148,108 +1857,746 @@ class MicroGUI(display.TFT):
 
 
 
-class Widget:
-    def __init__(self, bg=MicroGUI.BLACK,fg=MicroGUI.WHITE):
+class ScriptedTouch:
+    #stand-in touch source replaying a list of (t,x,y) samples, e.g. for host tests
+    def __init__(self, samples=None):
+        self.samples=[] if samples is None else list(samples)
+        self.pos=0
+
+    def press(self, x, y, n=1):
+        for i in range(n):
+            self.samples.append((True,x,y))
+        return self
+
+    def drag(self, start, end, n):
+        for i in range(n+1):
+            self.samples.append((True, start[0]+(end[0]-start[0])*i//n, start[1]+(end[1]-start[1])*i//n))
+        return self
+
+    def release(self, n=2):
+        for i in range(n):
+            self.samples.append((False,0,0))
+        return self
+
+    @property
+    def done(self):
+        return self.pos>=len(self.samples)
+
+    def pending(self):
+        #idle samples are consumed here, the touch loop only reads while pending
+        if self.done:
+            return False
+        if not self.samples[self.pos][0]:
+            self.pos+=1
+            return False
+        return True
+
+    def gettouch(self, raw=False):
+        if self.done:
+            return (False,0,0)
+        self.pos+=1
+        return self.samples[self.pos-1]
+
+
+class LocalTime:
+    #stand-in time source: the local time of the host, synced after delay ms like a network time
+    def __init__(self, delay=0):
+        self.delay=delay
+        self.synced=delay==0
+
+    async def sync(self):
+        await _sleep_ms(self.delay)
+        self.synced=True
+        return True
+
+    def localtime(self):
+        return localtime()
+
+class RtcTime(LocalTime):
+    #the RTC set by NTP, sync() waits for the RTC in the background
+    def __init__(self, server='hr.pool.ntp.org', tz='CET-1CEST', timeout=30000):
+        self.server=server
+        self.tz=tz
+        self.timeout=timeout
+        self.synced=False
+
+    async def sync(self):
+        rtc=RTC()
+        if not hasattr(rtc, 'ntp_sync'): #no network time, keep what the RTC has
+            self.synced=True
+            return True
+        rtc.ntp_sync(server=self.server, tz=self.tz)
+        start=ticks_ms()
+        while not rtc.synced():
+            if ticks_diff(ticks_ms(),start)>self.timeout:
+                return False
+            await _sleep_ms(200)
+        self.synced=True
+        return True
+
+class Scheduler:
+    #single task driving the periodic updates of all dynamic widgets
+    #ticks are aligned to multiples of the interval, widgets with the same period are
+    #updated in the same pass and written to the panel by a single flush
+    def __init__(self, screen):
+        self.screen=screen
+        self.timers={} #widget: [due, interval] in ms, a linear scan is fine for a few widgets
+        self.passes=0
+        self.running=False
+        self._wake=asyncio.Event()
+
+    def _next(self, now, interval):
+        return ticks_add(now, interval-now%interval)
+
+    def add(self, widget, interval):
+        self.timers[widget]=[self._next(ticks_ms(), interval), interval]
+        if self.running:
+            self._wake.set()
+        else:
+            self.running=True
+            _event_loop().create_task(self.run())
+
+    def remove(self, widget):
+        #suspend, e.g. when the page of the widget is hidden
+        self.timers.pop(widget, None)
+        if not self.timers:
+            self._wake.set() #let the task end
+
+    async def run(self):
+        screen=self.screen
+        while self.timers and screen.initiated:
+            now=ticks_ms()
+            wait=min(ticks_diff(t[0],now) for t in self.timers.values())
+            if wait>0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), wait/1000)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.passes+=1
+            for w,t in list(self.timers.items()):
+                if ticks_diff(t[0],now)<=0:
+                    t[0]=self._next(now, t[1]) #missed ticks are skipped
+                    screen.renderer.defer(w)
+        self.running=False
+
+
+class Renderer:
+    #single task drawing the queued invalidations, at most once per frame
+    #each frame dispatches the latest move sample of the touch loop first, then repaints the damage and the dirty widgets,
+    #then the deferred (low priority) widgets while the frame budget lasts
+    def __init__(self, screen, fps=50, max_defer=1000):
+        self.screen=screen
+        self.fps=fps #frames per second at most, also the budget of a frame
+        self.max_defer=max_defer #ms a deferred widget may wait for a frame with budget left
+        self.deferred=[] #[widget, ticks_ms], see defer()
+        self.running=False
+        self.frames=0
+        self.requests=0 #invalidations, many are drawn with the same frame
+        self.postponed=0 #frames that left deferred widgets for the next one
+        self.over_budget=0
+        self.queue=Ring(32) #damaged rects, dirty and deferred widgets at the start of a frame
+        self.frame_time=Ring(32) #us
+        self.input_latency=Ring(32) #us from a touch sample that caused a redraw to the end of the frame
+        self._input=None
+        self._last=ticks_ms()
+        self._wake=asyncio.Event()
+
+    def request(self):
+        #called by invalidate() and update(), wakes the render task
+        self.requests+=1
+        if self.running:
+            self._wake.set()
+        elif self.screen.initiated:
+            self.running=True
+            _event_loop().create_task(self.run())
+
+    def defer(self, widget):
+        #widget.update() when a frame has budget left, e.g. a clock or a widget out of focus
+        for d in self.deferred:
+            if d[0] is widget:
+                return
+        self.deferred.append([widget, ticks_ms()])
+        self.request()
+
+    def input(self):
+        #a touch sample was processed, measure until its redraw is on the panel
+        screen=self.screen
+        if self._input is None and (screen.damage or screen.dirty or screen._ops):
+            self._input=ticks_us()
+
+    def pending(self):
+        screen=self.screen
+        return bool(screen.damage or screen.dirty or screen._ops or self.deferred or screen._touch_move)
+
+    def frame(self):
+        #draw one frame now, returns the us spent
+        screen=self.screen
+        t=ticks_us()
+        self._last=ticks_ms()
+        if screen._touch_move: #read by the touch loop, the controller is not read again
+            screen._dispatch_move()
+            self.input()
+        self.queue.append(len(screen.damage)+len(screen.dirty)+len(self.deferred))
+        screen.flush()
+        budget=1000000//self.fps
+        deferred=self.deferred
+        while deferred:
+            d=deferred[0]
+            if ticks_diff(ticks_us(),t)>=budget and ticks_diff(self._last,d[1])<self.max_defer:
+                self.postponed+=1
+                break
+            del deferred[0]
+            w=d[0]
+            if w.is_visible:
+                w.update(screen, w.win)
+                screen.flush()
+        us=ticks_diff(ticks_us(),t)
+        if self._input is not None:
+            self.input_latency.append(ticks_diff(ticks_us(),self._input))
+            self._input=None
+        self.frame_time.append(us)
+        self.frames+=1
+        if us>budget:
+            self.over_budget+=1
+        return us
+
+    def stats(self):
+        return {'frames':self.frames, 'requests':self.requests, 'deferred':len(self.deferred),
+            'postponed':self.postponed, 'over_budget':self.over_budget, 'queue':self.queue.summary(),
+            'frame_us':self.frame_time.summary(), 'input_us':self.input_latency.summary()}
+
+    async def run(self):
+        screen=self.screen
+        while screen.initiated:
+            if not self.pending() or screen.animator.running: #a running animator draws the frames
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            wait=ticks_diff(ticks_add(self._last, 1000//self.fps), ticks_ms())
+            if wait>0:
+                await _sleep_ms(wait)
+                continue
+            self.frame()
+            await _sleep_ms(0) #touch samples go first
+        self.running=False
+
+
+class Command:
+    #runs a widget callback as a task, outside the touch handling
+    #the latest arguments win: calls made while fn runs collapse into one pending call
+    #fn may be a plain or an async function, a slow bus should be talked to asynchronously
+    __slots__=('fn','owner','error','stats','latency','_args','_t','_busy','_running')
+
+    def __init__(self, fn, n=16, owner=None):
+        self.fn=fn
+        self.owner=owner #widget calling the command, failures are printed if its screen has debug set
+        self.error=None #exception of the last failed call
+        self.stats={'calls':0,'dropped':0,'errors':0}
+        self.latency=Ring(n) #us from the oldest pending call to the return of fn
+        self._args=None #arguments of the pending call
+        self._t=0
+        self._busy=False #task started
+        self._running=False #within fn
+
+    @staticmethod
+    def wrap(fn, owner=None):
+        if fn is None or isinstance(fn, Command):
+            return fn
+        return Command(fn, owner=owner)
+
+    @property
+    def depth(self):
+        #calls pending or running
+        return (self._args is not None)+self._running
+
+    def __call__(self, *args):
+        if self._args is not None:
+            self.stats['dropped']+=1
+        else:
+            self._t=ticks_us()
+        self._args=args
+        if not self._busy:
+            self._busy=True
+            _event_loop().create_task(self._run())
+
+    async def _run(self):
+        try:
+            while self._args is not None:
+                args=self._args
+                t=self._t
+                self._args=None
+                self._running=True
+                try:
+                    r=self.fn(*args)
+                    if hasattr(r, 'send'): #coroutine or generator of an async function
+                        await r
+                except Exception as e:
+                    self.stats['errors']+=1
+                    self.error=e
+                    if self.owner is not None and self.owner.screen is not None and self.owner.screen.debug:
+                        print('command {} failed: {}'.format(self.fn, e))
+                self._running=False
+                self.stats['calls']+=1
+                self.latency.append(ticks_diff(ticks_us(),t))
+                await _sleep_ms(0)
+        finally:
+            self._busy=self._running=False
+
+
+#easing curves, p and the result in permille
+def linear(p):
+    return p
+
+def ease_out(p):
+    return 1000-(1000-p)*(1000-p)//1000
+
+def ease_in_out(p):
+    return p*p*(3000-2*p)//1000000
+
+def _lerp(a, b, e):
+    #a to b at e permille, element-wise for tuples, ints stay ints
+    if isinstance(a, tuple):
+        return tuple(_lerp(a[i], b[i], e) for i in range(len(a)))
+    if isinstance(a, int) and isinstance(b, int):
+        return a+(b-a)*e//1000
+    return a+(b-a)*e/1000
+
+class Tween:
+    #set(value) from start to end within ms, values are numbers or tuples of numbers
+    #e.g. Tween.var(slider_var, 80) or Tween(lambda s: frame.resize(0, s), 100, 300)
+    def __init__(self, set, start, end, ms=300, ease=ease_in_out, done=None):
+        self.set=set
+        self.start=start
+        self.end=end
+        self.ms=ms
+        self.ease=ease
+        self.done=done #called after the last frame
+        self.t0=0 #ticks_ms of the first frame, set by Animator.add()
+
+    @staticmethod
+    def var(var, end, ms=300, ease=ease_in_out, done=None):
+        #ease the value of a Var to end
+        def set(val):
+            var.val=val
+        return Tween(set, var.val, end, ms, ease, done)
+
+    def step(self, now):
+        #show the state at now, False after the last frame
+        p=min(1000, ticks_diff(now,self.t0)*1000//self.ms) if self.ms>0 else 1000
+        self.set(_lerp(self.start, self.end, self.ease(p)))
+        return p<1000
+
+class Transition:
+    #slide or fade from the rendering old to new within area, both lists of recorded primitives
+    #slide: dx,dy is the offset new starts from, old leaves in the opposite direction
+    #fade: new fades in from bg, old is not shown
+    def __init__(self, screen, area, old, new, dx=0, dy=0, bg=0, ms=250, ease=ease_out, done=None):
+        self.screen=screen
+        self.area=area
+        self.old=old
+        self.new=new
+        self.dx=dx
+        self.dy=dy
+        self.bg=bg
+        self.ms=ms
+        self.ease=ease
+        self.done=done
+        self.t0=0
+
+    def step(self, now):
+        p=min(1000, ticks_diff(now,self.t0)*1000//self.ms) if self.ms>0 else 1000
+        if p>=1000:
+            return False
+        e=self.ease(p)
+        area=self.area
+        ops=[]
+        if self.dx or self.dy:
+            dx=self.dx*(1000-e)//1000
+            dy=self.dy*(1000-e)//1000
+            for src,x,y in ((self.old, dx-self.dx, dy-self.dy), (self.new, dx, dy)):
+                for op in src:
+                    op=_clip_op(_move_op(op, x, y), area)
+                    if op is not None:
+                        ops.append(op)
+        else:
+            ops=[_tint_op(op, self.bg, e) for op in self.new]
+        self.screen._push(ops)
+        return True
+
+class Animator:
+    #single task running tweens and transitions at a target frame rate
+    #animations are functions of time: frames that cannot start in time are dropped, the animation jumps ahead
+    def __init__(self, screen, fps=30):
+        self.screen=screen
+        self.fps=fps
+        self.animations=[]
+        self.running=False
+        self.frames=0
+        self.dropped=0 #frames skipped because the previous ones took too long
+        self.over_budget=0 #frames that took longer than 1/fps
+        self.frame_time=Ring(32) #us spent per frame, including the flush
+        self._intervals=0 #between frames of the same run, for the achieved fps
+        self._interval_ms=0
+
+    def add(self, anim):
+        anim.t0=ticks_ms()
+        self.animations.append(anim)
+        if not self.running:
+            self.running=True
+            _event_loop().create_task(self.run())
+        return anim
+
+    def remove(self, anim):
+        #stop without the last frame
+        if anim in self.animations:
+            self.animations.remove(anim)
+
+    def stats(self):
+        #frames, dropped frames, fps achieved while animating and the frame time
+        fps=self._intervals*1000//self._interval_ms if self._interval_ms>0 else 0
+        return {'frames':self.frames, 'dropped':self.dropped, 'over_budget':self.over_budget,
+            'fps':fps, 'frame_us':self.frame_time.summary()}
+
+    async def run(self):
+        screen=self.screen
+        period=1000//self.fps
+        due=ticks_ms()
+        prev=None
+        while self.animations and screen.initiated:
+            now=ticks_ms()
+            late=ticks_diff(now,due)
+            if late<0:
+                await _sleep_ms(-late)
+                continue
+            if late>=period:
+                self.dropped+=late//period
+                due=ticks_add(due, late//period*period)
+            t=ticks_us()
+            finished=[]
+            with Var.batch():
+                for a in self.animations:
+                    if not a.step(now):
+                        finished.append(a)
+            for a in finished:
+                self.remove(a)
+                if a.done is not None:
+                    a.done()
+            screen.renderer.frame()
+            us=ticks_diff(ticks_us(),t)
+            self.frame_time.append(us)
+            if prev is not None:
+                self._intervals+=1
+                self._interval_ms+=ticks_diff(now,prev)
+            prev=now
+            self.frames+=1
+            if us>period*1000:
+                self.over_budget+=1
+            due=ticks_add(due, period)
+            await _sleep_ms(0)
+        self.running=False
+        screen.renderer.request() #invalidations made meanwhile
+
+
+class Style:
+    #colors and dimensions shared by many widgets, do not modify: get a shared copy with derive()
+    #owner is the only widget using a private copy, see _style_attr
+    _fields=('bg','fg','active_fg','bar_wd','ball_r','mar','align')
+    __slots__=_fields+('owner',)
+    _shared={}
+
+    def __init__(self, bg=MicroGUI.BLACK, fg=MicroGUI.WHITE, active_fg=MicroGUI.BLUE, bar_wd=4, ball_r=10, mar=15, align=1):
         self.bg=bg
         self.fg=fg
+        self.active_fg=active_fg
+        self.bar_wd=bar_wd
+        self.ball_r=ball_r
+        self.mar=mar
+        self.align=align
+        self.owner=None
+
+    @staticmethod
+    def get(bg=MicroGUI.BLACK, fg=MicroGUI.WHITE, active_fg=MicroGUI.BLUE, bar_wd=4, ball_r=10, mar=15, align=1):
+        #one instance per distinct set of values
+        key=(bg,fg,active_fg,bar_wd,ball_r,mar,align)
+        style=Style._shared.get(key)
+        if style is None:
+            style=Style._shared[key]=Style(*key)
+        return style
+
+    def derive(self, **changes):
+        values={k:getattr(self,k) for k in Style._fields}
+        values.update(changes)
+        return Style.get(**values)
+
+def _set_style_attr(widget, name, val):
+    #the first assignment gives the widget a private copy of its Style, changed in place from then on
+    #interning each value would keep one Style per step of e.g. a color Tween for the whole program
+    style=widget.style
+    if style.owner is not widget:
+        style=Style(*[getattr(style,k) for k in Style._fields])
+        style.owner=widget
+        widget.style=style
+    setattr(style, name, val)
+
+def _style_attr(name):
+    #widget attribute kept in its Style
+    return property(lambda self: getattr(self.style, name), lambda self, val: _set_style_attr(self, name, val))
+
+
+class Widget:
+    #__slots__ avoid a dict per instance on CPython, MicroPython ignores them
+    __slots__=('style','screen','is_visible','parent','_slot','_win')
+
+    def __init__(self, bg=MicroGUI.BLACK,fg=MicroGUI.WHITE, style=None):
+        self.style=style if style is not None else Style.get(bg,fg)
+        self.screen=None #the MicroGUI showing the widget, set by place()
         self.is_visible=False
+        self.parent=None
+        self._slot=-1 #index of the box in the parent Frame, -1 if the window is kept in _win
+        self._win=None
 
-    def draw(self,screen, win):
-        #print('draw {} at {}'.format(self,win))
+    bg=_style_attr('bg')
+    fg=_style_attr('fg')
+
+    @property
+    def win(self):
+        #window of the widget, packed into an array by the parent Frame
+        #None for a widget packed after the last layout of the Frame
+        if self._slot<0:
+            return self._win
+        b=self.parent._boxes
+        i=4*self._slot
+        if i>=len(b):
+            return None
+        return (b[i],b[i+1],b[i+2],b[i+3])
+
+    def place(self, screen, win):
+        #remember where the widget is shown, without drawing
         if screen is not None:
             self.screen=screen
-        if win is not None:
-            self.win=win
+        if win is not None and self._slot<0:
+            self._win=win
         self.is_visible=True
-        self.screen.setwin(*self.win)
-        self.screen.set_bg(self.bg)
-        self.screen.set_fg(self.fg)
+
+    def draw(self,screen, win):
+        #print('draw {} at {}'.format(self,win))
+        self.place(screen, win)
+        self.screen.setbox(self.win)
+        self.screen.set_bg(self.style.bg)
+        self.screen.set_fg(self.style.fg)
         #self.screen.clearwin()
         
+    def invalidate(self):
+        #schedule a redraw of this widget with the next flush
+        self.stale()
+        if self.is_visible:
+            self.screen.invalidate(self.win)
+
+    def stale(self):
+        #the content changed, drop cached renderings of the containing pages
+        if self.parent is not None:
+            self.parent.stale()
+
+    def show(self, screen, win):
+        #mark as shown after a cached rendering has been replayed
+        self.place(screen, win)
+
+    def cacheable(self):
+        #False if the rendering changes without invalidate()
+        return True
+
+    def retainable(self):
+        #True if the rendering can be diffed in retained mode, containers diff their widgets
+        return self.cacheable()
+
+    def render(self, screen, win):
+        #draw, timed if the screen has a profiler
+        prof=screen.profiler
+        if prof is not None:
+            t=ticks_us()
+        if screen.lists is not None and self.retainable():
+            screen.retain(self, win)
+        else:
+            self.draw(screen, win)
+        if prof is not None:
+            prof.drawn(self, ticks_diff(ticks_us(),t))
+
+    def refresh(self):
+        #incremental update requested by screen.update(), redraws the widget by default
+        self.draw(None, None)
+
+    def repaint(self, screen, win, rects):
+        #redraw if win intersects any of the damaged rects, returns the number of widgets drawn
+        for r in rects:
+            if _overlaps(r,win):
+                self.render(screen, win)
+                return 1
+        return 0
+
+    def relayout(self):
+        #drop cached geometry, e.g. after orientation change
+        pass
+
     def deactivate(self):
         self.is_visible=False
+        self.forget()
+
+    def release(self):
+        #drop the references held by Vars and the screen, e.g. when the page is torn down
+        self.is_visible=False
+        self.forget()
+
+    def forget(self):
+        #the rendering is no longer on screen, drop its display list
+        if self.screen is not None and self.screen.lists:
+            self.screen.lists.pop(self, None)
 
     def on_touch(self,pos, win, screen):        
         return self, win
     def on_move(self, pos, win, screen):
         pass
     def on_release(self, pos, win, screen):
-        print('unhandled release on {} at {}'.format(self, pos))
-        pass
+        if screen.debug:
+            print('unhandled release on {} at {}'.format(self, tuple(pos)))
 
 class Frame(Widget):
-    def __init__(self,  bg=MicroGUI.BLUE,fg=MicroGUI.WHITE, side=0):
-        super().__init__( bg,fg)
+    __slots__=('widgets','sizes','side','_layout_win','_boxes','_bounds')
+
+    def __init__(self,  bg=MicroGUI.BLUE,fg=MicroGUI.WHITE, side=0, style=None):
+        super().__init__( bg,fg, style)
         self.widgets=[]        
         self.sizes=[]
         self.side=side#todo: this is not considered 
+        self._layout_win=None #window the cached boxes were computed for
+        self._boxes=array('h') #x1,y1,x2,y2 of each packed widget
+        self._bounds=array('h') #end coordinate of each box along the packing direction
     
     def pack(self, widget, size=1):
+        widget.parent=self
+        widget._slot=len(self.widgets)
         self.widgets.append(widget)
         self.sizes.append(size)
-        
+        self._layout_win=None
 
-    def draw(self,screen=None, win=None):
-        super().draw(screen, win)
+    def relayout(self):
+        self._layout_win=None
+        for w in self.widgets:
+            w.relayout()
 
-        #self.screen.clearwin()
-        if len(self.widgets)==0:
+    def resize(self, index, size):
+        #change the share of a packed widget, e.g. tweened for an animated layout
+        if self.sizes[index]!=size:
+            self.sizes[index]=size
+            self._layout_win=None
+            self.invalidate()
+
+    def layout(self, win):
+        #pack the windows of the widgets within win, kept until pack(), relayout() or a new win
+        if win==self._layout_win:
             return
-        if self.side==0:
-            step=(self.win[3]-self.win[1])/sum(self.sizes)
-            offset=self.win[1] 
+        n=len(self.widgets)
+        if n==0:
+            bounds=[]
+        elif self.side==0:
+            bounds=_split(win[1],win[3],self.sizes)
         elif self.side==1:
-            step=(self.win[2]-self.win[0])/sum(self.sizes)
-            offset=self.win[0] 
+            bounds=_split(win[0],win[2],self.sizes)
         else: raise NotImplementedError
-
-        for w,s in zip(self.widgets, self.sizes):
+        if len(self._boxes)!=4*n:
+            self._boxes=array('h',[0]*4*n)
+        self._bounds=array('h',bounds)
+        b=self._boxes
+        start=win[1] if self.side==0 else win[0]
+        for i in range(n):
             if self.side==0:
-                widget_win=(self.win[0], int(offset),self.win[2],int(offset+step*s)) 
-            elif self.side==1:
-                widget_win=(int(offset),self.win[1],int(offset+step*s),self.win[3]) 
-            else: raise NotImplementedError
-            w.draw(self.screen, widget_win)
-            offset+=step*s
+                b[4*i]=win[0]
+                b[4*i+1]=start
+                b[4*i+2]=win[2]
+                b[4*i+3]=bounds[i]
+            else:
+                b[4*i]=start
+                b[4*i+1]=win[1]
+                b[4*i+2]=bounds[i]
+                b[4*i+3]=win[3]
+            start=bounds[i]
+        self._layout_win=win
+
+    def draw(self,screen=None, win=None):
+        super().draw(screen, win)
+
+        #self.screen.clearwin()
+        self.layout(self.win)
+        for w in self.widgets:
+            w.render(self.screen, w.win)
+
+    def repaint(self, screen, win, rects):
+        for r in rects:
+            if _contains(r,win):
+                self.render(screen,win)
+                return len(self.widgets)
+        self.place(screen, win)
+        self.layout(win)
+        n=0
+        for w in self.widgets:
+            n+=w.repaint(screen, w.win, rects)
+        return n
+
+    def show(self, screen, win):
+        self.place(screen, win)
+        self.layout(win)
+        for w in self.widgets:
+            w.show(screen, w.win)
+
+    def cacheable(self):
+        for w in self.widgets:
+            if not w.cacheable():
+                return False
+        return True
+
+    def retainable(self):
+        return False
+
     def deactivate(self):
         self.is_visible=False
         for w in self.widgets:
             w.deactivate()
-    
-    def _get_rel_widget_wd(self,pos_rel):#pos_rel is between 0 and 1
-        total=sum(self.sizes)
-        i=0
-        for idx,s in enumerate(self.sizes):
-            i+=(s/total)
-            if i>= pos_rel:
-                return idx,i-s/total, i 
-        raise GuiException('Frame widget in {} at relative position {} not found'.format(self, pos_rel) )
 
+    def release(self):
+        super().release()
+        for w in self.widgets:
+            w.release()
+    
     def on_touch(self,pos, win, screen):    
-        if self.side==0:#top
-            if pos[1]>win[3]:
-                raise GuiException('touch outside window in {}, touch at pos {} with window defined as {}'.format(self,pos, win))            
-            idx,start, end=self._get_rel_widget_wd((pos[1]-win[1])/(win[3]-win[1]))            
-            height=win[3]-win[1]
-            new_win=(win[0], win[1]+int(start*height), win[2], win[1]+int(end*height))
-        elif self.side==1:#left
-            if pos[0]>win[2]:
-                raise GuiException('touch outside window in {}, touch at pos {} with window defined as {}'.format(self,pos, win))      
-            idx,start, end=self._get_rel_widget_wd((pos[0]-win[0])/(win[2]-win[0]))
-            width=win[2]-win[0]
-            new_win=(win[0]+int(start*width), win[1], win[0]+int(end*width), win[3])
-        else: 
-            return NotImplementedError        
-        return self.widgets[idx].on_touch(pos, new_win, screen)
+        self.layout(win)
+        idx=_bisect(self._bounds, pos[1] if self.side==0 else pos[0])
+        if idx>=len(self.widgets):
+            raise GuiException('touch outside window in {}, touch at pos {} with window defined as {}'.format(self,pos, win))
+        w=self.widgets[idx]
+        return w.on_touch(pos, w.win, screen)
 
 class Menue(Widget):
-    def __init__(self, title_size, side=0,callback=None):
+    __slots__=('active','title_size','side','callback','pages','keep','transition','transition_ms','_transition','_layout_win','_header','_page','_tabs','_tab_bounds','cache','_tab_update')
+
+    def __init__(self, title_size, side=0,callback=None, cache_size=200, keep=None, transition=None, transition_ms=250):
         super().__init__()
         self.active=0
+        self.transition=transition #page change: None (instant), 'slide' or 'fade'
+        self.transition_ms=transition_ms
+        self._transition=None #running Transition
+        self.keep=keep #tear down pages with a builder after keep ms inactive, None: never
         self.title_size=title_size
         self.side=side #0=top, 1=left, (todo: 2=bottom, 3=right not implemented so far)
         self.callback=callback #gets called uppon page change
         self.pages=[]
+        self._layout_win=None #window the cached boxes were computed for
+        self._header=self._page=None
+        self._tabs=[]
+        self._tab_bounds=[]
+        #rendered tabs and pages, limited to cache_size primitives
+        self.cache=LRUCache(cache_size)
+        self._tab_update=None #(previous, new) active tab, see refresh()
     
     def get_page(self,title):
         for p in self.pages:
@@ -257,94 +2604,282 @@ class Menue(Widget):
                 return p
         raise GuiException('page "{}" not found'.format(title))
 
-    def add_page(self, title,title_bg=MicroGUI.BLUE,title_fg=MicroGUI.WHITE,bg=MicroGUI.BLACK,fg=MicroGUI.WHITE,side=0):
-        self.pages.append(MenuePage(title,title_bg,title_fg,bg,fg,  side))
+    def add_page(self, title,title_bg=MicroGUI.BLUE,title_fg=MicroGUI.WHITE,bg=MicroGUI.BLACK,fg=MicroGUI.WHITE,side=0, builder=None):
+        #builder(page) packs the widgets of the page when it is first activated
+        self.pages.append(MenuePage(title,title_bg,title_fg,bg,fg,  side, builder))
+        self.pages[-1].parent=self
+        self._layout_win=None
+        self.cache.clear()
         return self.pages[-1]
-    
-    def on_touch(self, pos, win, screen):        
+
+    def drop_cache(self, page):
+        self.cache.discard(page)
+
+    def _active(self):
+        #the active page, built on first use
+        page=self.pages[self.active]
+        if not page.built:
+            page.build()
+        return page
+
+    def collect(self, now=None):
+        #tear down the pages inactive for more than keep ms, returns their number
+        if self.keep is None:
+            return 0
+        if now is None:
+            now=ticks_ms()
+        n=0
+        for i,p in enumerate(self.pages):
+            if i!=self.active and p.built and p.builder is not None and ticks_diff(now,p.hidden_at)>=self.keep:
+                self.drop_cache(p)
+                p.teardown()
+                n+=1
+        return n
+
+    def update(self, screen, win):
+        #called by the scheduler while hidden pages wait for collect()
+        self.collect()
+        for i,p in enumerate(self.pages):
+            if i!=self.active and p.built and p.builder is not None:
+                return
+        screen.scheduler.remove(self)
+
+    def release(self):
+        super().release()
+        for p in self.pages:
+            p.release()
+
+    def relayout(self):
+        self._layout_win=None
+        self.cache.clear()
+        for p in self.pages:
+            p.relayout()
+
+    def layout(self, win):
+        #compute header, page and tab boxes once per window
+        if win==self._layout_win:
+            return
         if self.side==0:#top
-            if pos[1]-win[1]<self.title_size:
-                return self, win#(win[0], win[1], win[2], win[1]+self.title_size)
-            else:
-                return self.pages[self.active].on_touch(pos, (win[0], win[1]+self.title_size, win[2], win[3]), screen)
+            self._header=(win[0],win[1],win[2],win[1]+self.title_size)
+            self._page=(win[0],win[1]+self.title_size,win[2],win[3])
+            self._tab_bounds=_split(win[0],win[2],[1]*len(self.pages))
+            self._tabs=[(x0,win[1],x1,win[1]+self.title_size) for x0,x1 in zip([win[0]]+self._tab_bounds,self._tab_bounds)]
         elif self.side==1:#left
-            if pos[0]-win[0]<self.title_size:
-                return self, win#(win[0], win[1], win[0]+self.title_size, win[1])
-            else:
-                return self.pages[self.active].on_touch(pos, (win[0]+self.title_size, win[1], win[2], win[3]), screen)
-        else: 
-            return NotImplementedError
+            self._header=(win[0],win[1],win[0]+self.title_size,win[3])
+            self._page=(win[0]+self.title_size,win[1],win[2],win[3])
+            self._tab_bounds=_split(win[1],win[3],[1]*len(self.pages))
+            self._tabs=[(win[0],y0,win[0]+self.title_size,y1) for y0,y1 in zip([win[1]]+self._tab_bounds,self._tab_bounds)]
+        else:
+            raise NotImplementedError
+        self._layout_win=win
+        self.cache.clear()
+
+    def on_touch(self, pos, win, screen):        
+        self.layout(win)
+        if self.side==0:#top
+            in_header=pos[1]<self._header[3]
+        else:#left
+            in_header=pos[0]<self._header[2]
+        if in_header:
+            return self, win
+        return self._active().on_touch(pos, self._page, screen)
 
     def on_release(self, pos, win, screen):
-        print('release in menue, prev page = '+self.pages[self.active].title)
+        if screen.debug:
+            print('release in menue, prev page = '+self.pages[self.active].title)
         selected= self.active
-        
+        self.layout(win)
         if self.side==0:#top
-            if pos[1]-win[1]<self.title_size:
-                #determine widget
-                selected=int((pos[0]-win[0])/(win[2]-win[0]+1) *len(self.pages))
-        elif self.side==1:#left
-            if pos[0]-win[0]<self.title_size:
-                #determine widget
-                selected=int((pos[1]-win[1])/(win[3]-win[1]+1)*len(self.pages))
-        else: raise NotImplementedError
+            if pos[1]<self._header[3]:
+                selected=_bisect(self._tab_bounds,pos[0])
+        else:#left
+            if pos[0]<self._header[2]:
+                selected=_bisect(self._tab_bounds,pos[1])
+        selected=min(selected,len(self.pages)-1)
         if selected!= self.active:
-            print('selected '+self.pages[selected].title)
+            if screen.debug:
+                print('selected '+self.pages[selected].title)
+            old=self._rendering() if self.transition is not None else None
             self.pages[self.active].deactivate()
+            self.pages[self.active].hidden_at=ticks_ms()
+            self._tab_update=(self.active, selected)
+            prev=self.active
             self.active=selected
-            self.draw(screen,win)
+            self.collect()
+            if self.keep is not None and self.pages[prev].builder is not None:
+                screen.scheduler.add(self, self.keep) #also while the user stays on this page
+            self.stale()
+            screen.update(self)
+            if old is None:
+                screen.invalidate(self._page)
+            else:
+                self._animate(old, selected>prev)
             if self.callback is not None:
                 self.callback()
 
+    def _rendering(self):
+        #recorded primitives of the active page
+        page=self._active()
+        ops=self.cache.get(page)
+        if ops is None:
+            ops=self.screen.record(page, self._page)
+        return ops
+
+    def _animate(self, old, forward):
+        #page change as a transition, the new page is drawn as usual after the last frame
+        screen=self.screen
+        if self._transition is not None:
+            screen.animator.remove(self._transition)
+        new=self._rendering()
+        self._active().deactivate() #shown by the transition until it is drawn
+        area=self._page
+        def done():
+            self._transition=None
+            screen.invalidate(area)
+        dx=dy=0
+        if self.transition=='slide':
+            d=1 if forward else -1
+            if self.side==0:
+                dx=d*(area[2]-area[0])
+            else:
+                dy=d*(area[3]-area[1])
+        self._transition=screen.animator.add(Transition(screen, area, old, new, dx, dy, self._active().style.bg, self.transition_ms, done=done))
+
+    def refresh(self):
+        #page switch: repaint the tabs of the previous and new page only
+        prev,new=self._tab_update
+        self._tab_update=None
+        p0=self.pages[prev]
+        p1=self.pages[new]
+        if p0.title_bg!=p1.title_bg or p0.title_fg!=p1.title_fg:
+            self.draw_header()
+        else:
+            self.draw_tab(prev, True)
+            self.draw_tab(new, True)
+
     def draw(self,screen=None, win=None):
         super().draw(screen, win)
-        #draw header
+        self.draw_header()
+        self.draw_page()
+
+    def repaint(self, screen, win, rects):
+        n=0
+        self.place(screen, win)
+        self.layout(win)
+        for r in rects:
+            if _overlaps(r,self._header):
+                self.draw_header()
+                n+=1
+                break
+        for r in rects:
+            if _contains(r,self._page):
+                self.draw_page()
+                return n+1
+        return n+self._active().repaint(screen, self._page, rects)
+
+    def draw_page(self):
+        #draw the active page, replaying its last rendering if nothing changed since
+        page=self._active()
+        ops=self.cache.get(page)
+        if ops is not None:
+            self.screen.replay(ops)
+            page.show(self.screen, self._page)
+            return
+        self.screen.begin_capture()
+        page.render(self.screen, self._page)
+        ops=self.screen.end_capture()
+        if page.cacheable():
+            self.cache.put(page, ops, len(ops))
+
+    def show(self, screen, win):
+        self.place(screen, win)
+        self.layout(win)
+        self._active().show(screen, self._page)
+
+    def cacheable(self):
+        return self._active().cacheable()
+
+    def retainable(self):
+        return False
+
+    def deactivate(self):
+        self.is_visible=False
+        self.pages[self.active].deactivate()
+        if self.screen is not None:
+            self.screen.scheduler.remove(self)
+
+    def draw_header(self):
         if len(self.pages) ==0:
             raise GuiException('Attempt to draw menue without defining pages')
-        if self.side==0:#top 
-            self.screen.setwin(self.win[0],self.win[1],self.win[2],self.title_size+self.win[1])
-            step=(self.win[2]-self.win[0])/len(self.pages)
-            offset=self.win[0]
-        elif self.side==1:#left 
-            self.screen.setwin(self.win[0],self.win[1],self.win[0]+self.title_size,self.win[3])
-            step=(self.win[3]-self.win[1])/len(self.pages)
-            offset=self.win[1]
-        else:
-            raise NotImplementedError
-        
+        screen=self.screen
+        self.layout(self.win)
+        screen.setbox(self._header)
         screen.set_bg(self.pages[self.active].title_bg)
         screen.set_fg(self.pages[self.active].title_fg)
         screen.clearwin()
-        
-        for i,p in enumerate(self.pages):
-            if self.side==0:
-                screen.setwin(int(offset),win[1],int(offset+step),self.title_size+win[1])
-            elif self.side==1:
-                screen.setwin(win[0], int(offset), win[0]+self.title_size, int(offset+step))
-            screen.text(screen.CENTER, screen.CENTER,p.title)
-            if i==self.active:#underline active
-                length=screen.textWidth(p.title)   
-                if self.side==0:
-                    line_x=int((step-length)/2 )
-                    line_y=int((self.title_size+screen.fontSize()[1])/2+2)
-                elif self.side==1:
-                    line_x=int((self.title_size-length)/2 )
-                    line_y=int((step+screen.fontSize()[1])/2+2)
-                screen.line(line_x,line_y,line_x+length,line_y)       
-            offset+=step     
-        if self.side==0:    
-            self.pages[self.active].draw(screen,(win[0],win[1]+self.title_size,win[2],win[3]))
-        elif self.side==1:
-            self.pages[self.active].draw(screen, (win[0]+self.title_size,win[1],win[2],win[3]))
+        for i in range(len(self.pages)):
+            self.draw_tab(i)
+
+    def draw_tab(self, i, clear=False):
+        screen=self.screen
+        p=self.pages[self.active]
+        key=(i, i==self.active, clear, p.title_bg, p.title_fg)
+        ops=self.cache.get(key)
+        if ops is not None:
+            screen.replay(ops)
+            return
+        screen.set_bg(p.title_bg)
+        screen.set_fg(p.title_fg)
+        screen.begin_capture()
+        p=self.pages[i]
+        tab=self._tabs[i]
+        screen.setbox(tab)
+        if clear:
+            screen.clearwin()
+        screen.text(screen.CENTER, screen.CENTER,p.title)
+        if i==self.active:#underline active
+            length=screen.textWidth(p.title)   
+            line_x=(tab[2]-tab[0]-length)//2
+            line_y=(tab[3]-tab[1]+screen.fontSize()[1])//2+2
+            screen.line(line_x,line_y,line_x+length,line_y)       
+        ops=screen.end_capture()
+        self.cache.put(key, ops, len(ops))
 
 class MenuePage(Frame):
-    def __init__(self, title, title_bg, title_fg,bg=MicroGUI.BLUE,fg=MicroGUI.WHITE, side=0):
+    __slots__=('title','title_bg','title_fg','builder','built','hidden_at')
+
+    def __init__(self, title, title_bg, title_fg,bg=MicroGUI.BLUE,fg=MicroGUI.WHITE, side=0, builder=None):
         super().__init__( bg,fg,side)
         self.title=title
         self.title_bg=title_bg
         self.title_fg=title_fg
+        self.builder=builder
+        self.built=builder is None
+        self.hidden_at=0 #ticks_ms when the page was left
+
+    def build(self):
+        if not self.built:
+            self.built=True
+            self.builder(self)
+
+    def teardown(self):
+        #drop the widgets, Vars keep their values and the builder creates the widgets again
+        self.release()
+        self.widgets=[]
+        self.sizes=[]
+        self._layout_win=None
+        self._boxes=array('h')
+        self._bounds=array('h')
+        self.built=False
+
+    def stale(self):
+        if self.parent is not None:
+            self.parent.drop_cache(self)
+        super().stale()
         
 class Label(Widget):    
+    __slots__=('halign','valign','text','decoration','_text','_box')
+
     def __init__(self,text,decoration='{}',halign=1,valign=1):
         super().__init__()
         self.halign=halign
@@ -355,17 +2890,50 @@ class Label(Widget):
             text=Var(text, self)
         self.text=text
         self.decoration=decoration
+        self._text=None #formatted text and box on screen
+        self._box=None
     
     def draw(self,screen=None, win=None):
         super().draw(screen, win)
         self.screen.clearwin()
-        self.screen.text(self.screen.halign_const[self.halign],self.screen.valign_const[self.valign],self.decoration.format(self.text.val))
+        self._draw_text()
+
+    def _draw_text(self, text=None):
+        if text is None:
+            text=self.decoration.format(self.text.val)
+        box=self.screen.text_box(self.halign, self.valign, text)
+        self.screen.text(box[0], box[1], text)
+        self._text=text
+        self._box=box
+
+    def invalidate(self):
+        if self.is_visible and self._box is not None:
+            self.stale()
+            self.screen.update(self)
+        else:
+            super().invalidate()
+
+    def release(self):
+        super().release()
+        self.text.unbind(self)
+
+    def refresh(self):
+        #clear the previous text only, nothing to do if the formatted text did not change
+        text=self.decoration.format(self.text.val)
+        if text==self._text:
+            return
+        old=self._box
+        super().draw(None, None)
+        self.screen.rect(old[0],old[1],old[2],old[3],self.style.bg,self.style.bg)
+        self._draw_text(text)
 
 class Button(Label):
+    __slots__=('command',)
+
     def __init__(self, text, command,margin,halign=1,valign=1):
         #todo: margins, minsize, maxsize
         super().__init__(text,halign,valign)
-        self.command=command #must be callable
+        self.command=Command.wrap(command, self) #must be callable, runs as a task
 
     #def on_touch(self, pos) change color
 
@@ -374,8 +2942,13 @@ class Button(Label):
         self.command()
     
 class Slider(Widget): 
-    def __init__(self,  value,horizontal=True, min=0, max=100, command=None, bg=MicroGUI.BLACK,fg=MicroGUI.LIGHTGRAY, active_fg=MicroGUI.BLUE, bar_wd=4,ball_r=10 , align=1, mar=15):
-        super().__init__()
+    __slots__=('value','horizontal','min','max','command','live','_sent','_knob','move_pixels')
+
+    def __init__(self,  value,horizontal=True, min=0, max=100, command=None, live=None, bg=MicroGUI.BLACK,fg=MicroGUI.LIGHTGRAY, active_fg=MicroGUI.BLUE, bar_wd=4,ball_r=10 , align=1, mar=15, style=None):
+        #command(value) is called on release, and every live ms while dragging if live is set
+        if style is None:
+            style=Style.get(bg,fg,active_fg,bar_wd,ball_r,mar,align)
+        super().__init__(style=style)
         if isinstance(value,Var):
             value.widgets.append(self)
         else:
@@ -384,14 +2957,21 @@ class Slider(Widget):
         self.horizontal=horizontal 
         self.min=min
         self.max=max
-        self.command=command
-        self.bg=bg
-        self.fg=fg
-        self.active_fg=active_fg
-        self.bar_wd=bar_wd
-        self.ball_r=ball_r
-        self.mar=mar
-        self.align=align
+        self.command=Command.wrap(command, self)
+        self.live=live
+        self._sent=None #[ticks_ms, value] of the last live call
+        self._knob=None #drawn knob (position, active color)
+        self.move_pixels=0 #pixels written by the last draw or move, counted on flush with a framebuffer
+
+    active_fg=_style_attr('active_fg')
+    bar_wd=_style_attr('bar_wd')
+    ball_r=_style_attr('ball_r')
+    mar=_style_attr('mar')
+    align=_style_attr('align')
+
+    def release(self):
+        super().release()
+        self.value.unbind(self)
 
     def set_val(self,value, screen, win):
         self.value=value
@@ -402,120 +2982,991 @@ class Slider(Widget):
         self.on_move(pos, win, screen)   
         return self, win
 
-    def on_move(self,pos, win, screen):        
+    def on_move(self,pos, win, screen):
+        #integer math, called for every touch sample
         if self.horizontal:
-            pos_rel=(pos[0]-win[0]-self.mar)/(win[2]-win[0]-2*self.mar)
+            length=win[2]-win[0]-2*self.style.mar
+            p=pos[0]-win[0]-self.style.mar
         else:
-            pos_rel=1-(pos[1]-win[1]-self.mar)/(win[3]-win[1]-2*self.mar)
-        if pos_rel<0:
-            pos_rel=0
-        elif pos_rel>1:
-            pos_rel=1
-        self.value.val=int(self.min+pos_rel*(self.max-self.min))
-        print ('new value {}'.format(self.value.val))
+            length=win[3]-win[1]-2*self.style.mar
+            p=length-(pos[1]-win[1]-self.style.mar)
+        if p<0:
+            p=0
+        elif p>length:
+            p=length
+        self.value.val=self.min+p*(self.max-self.min)//length
+        if screen.debug:
+            print ('new value {}'.format(self.value.val))
+        if self.live is not None and self.command is not None:
+            val=self.value.val
+            now=ticks_ms()
+            if self._sent is None:
+                self._sent=[ticks_add(now,-self.live), None]
+            if val!=self._sent[1] and ticks_diff(now,self._sent[0])>=self.live:
+                self._sent[0]=now
+                self._sent[1]=val
+                self.command(val)
     
     def on_release(self, pos, win,screen):
         if self.command is not None:
-            self.command(self.value.val)
+            if self._sent is None or self._sent[1]!=self.value.val:
+                self.command(self.value.val)
+            self._sent=None
+
+    def _knob_pos(self):
+        #knob center along the bar, relative to the window
+        if self.horizontal:
+            length=self.win[2]-self.win[0]-2*self.style.mar
+            val=self.value.val-self.min
+        else:
+            length=self.win[3]-self.win[1]-2*self.style.mar
+            val=self.max-self.value.val
+        val=max(0,min(val,self.max-self.min))
+        return self.style.mar+val*length//(self.max-self.min)
+
+    def _draw_bar(self, a, b, knob):
+        #bar segment between a and b, active left of (horizontal) or below (vertical) the knob
+        if self.horizontal:
+            end=self.win[2]-self.win[0]-self.style.mar
+        else:
+            end=self.win[3]-self.win[1]-self.style.mar
+        a=max(a,self.style.mar)
+        b=end if b is None else min(b,end)
+        if self.horizontal:
+            y=(self.win[3]-self.win[1]-self.style.bar_wd)//2
+            if knob>a:
+                self.screen.rect(a, y, min(b,knob)-a, self.style.bar_wd, self.style.active_fg,self.style.active_fg)
+            if knob<b:
+                self.screen.rect(max(a,knob), y, b-max(a,knob), self.style.bar_wd, self.style.fg,self.style.fg)
+        else:
+            x=(self.win[2]-self.win[0]-self.style.bar_wd)//2
+            if knob>a:
+                self.screen.rect(x, a, self.style.bar_wd, min(b,knob)-a, self.style.fg,self.style.fg)
+            if knob<b:
+                self.screen.rect(x, max(a,knob), self.style.bar_wd, b-max(a,knob), self.style.active_fg,self.style.active_fg)
+
+    def _knob_center(self, knob):
+        if self.horizontal:
+            return knob, (self.win[3]-self.win[1])//2
+        return (self.win[2]-self.win[0])//2, knob
+
+    def _draw_knob(self, knob):
+        if self.value.val>self.min:
+            fg=bg=self.style.active_fg
+        else:
+            fg=self.style.fg
+            bg=self.style.bg
+        x,y=self._knob_center(knob)
+        self.screen.circle(x,y,self.style.ball_r, fg, bg)
+
+    def _erase_knob(self, knob):
+        x,y=self._knob_center(knob)
+        r=self.style.ball_r
+        self.screen.rect(x-r,y-r,2*r+1,2*r+1,self.style.bg,self.style.bg)
 
     def draw(self, screen=None,win=None):
         super().draw(screen, win)
-        
+        start=self.screen.pixels
         self.screen.clearwin()
-        val_rel=(self.value.val-self.min)/(self.max-self.min)
-        if self.value.val>self.min:
-                fg=bg=self.active_fg
-        else:
-            fg=self.fg
-            bg=self.bg
-        if self.horizontal:#left to right
-            len=self.win[2]-self.win[0]-2*self.mar
-            y=int((self.win[3]-self.win[1]-self.bar_wd)/2)
-            self.screen.rect(self.mar, y, int(val_rel*len), self.bar_wd, self.active_fg,self.active_fg)
-            self.screen.rect(int(self.mar+val_rel*len), y, int((1-val_rel)*len), self.bar_wd, self.fg,self.fg)            
-            self.screen.circle(int(self.mar+val_rel*len),int((self.win[3]-self.win[1])/2),self.ball_r, fg, bg)
-        else: #bottom to top
-            len=self.win[3]-self.win[1]-2*self.mar
-            x=int((self.win[2]-self.win[0]-self.bar_wd)/2)
-            self.screen.rect(x,self.mar,  self.bar_wd, int((1-val_rel)*len),self.fg,self.fg)
-            self.screen.rect(x,int(self.mar+(1-val_rel)*len), self.bar_wd,int(val_rel*len),  self.active_fg,self.active_fg)
-            
-            self.screen.circle(int((self.win[2]-self.win[0])/2),int(self.mar+(1-val_rel)*len),self.ball_r, fg, bg)
+        knob=self._knob_pos()
+        self._draw_bar(self.style.mar, None, knob)
+        self._draw_knob(knob)
+        self._knob=(knob, self.value.val>self.min)
+        self.move_pixels=self.screen.pixels-start
 
-        
+    def invalidate(self):
+        if self.is_visible and self._knob is not None:
+            self.stale()
+            self.screen.update(self)
+        else:
+            super().invalidate()
 
+    def refresh(self):
+        #repaint only the strip between the previous and the new knob position
+        #min and min+1 may share a pixel on a short bar, but not the knob color
+        knob=self._knob_pos()
+        old=self._knob
+        if (knob, self.value.val>self.min)==old:
+            return
+        old=old[0]
+        start=self.screen.pixels
+        super().draw(None, None)
+        r=self.style.ball_r
+        self._erase_knob(old)
+        self._erase_knob(knob)
+        self._draw_bar(min(old,knob)-r, max(old,knob)+r+1, knob)
+        self._draw_knob(knob)
+        self._knob=(knob, self.value.val>self.min)
+        self.move_pixels=self.screen.pixels-start
 
 class CheckBox(Widget):
-    pass
+    __slots__=()
 
 class RadioButton(Widget):
-    pass
+    __slots__=()
 
 class Switch(CheckBox):
-    pass
+    __slots__=()
 
 class Chart(Widget):
-    pass
+    #live plot, new samples are drawn at a cursor that sweeps over the widget and wraps around
+    #the samples are kept in a Ring of capacity values, each column shows the min/max of per_col samples
+    #span: number of samples across the width, the full buffer by default
+    #per_col is chosen so that all samples on screen are held in the Ring, a span below the width
+    #shows one sample per column, a capacity below the width uses capacity columns
+    #min, max: fixed value range, scaled to the data if None
+    __slots__=('series','span','autoscale','range','gap','value','per_col','_top','_bot','_seg','_drawn','_rescale','_cmin','_cmax','_h')
+
+    def __init__(self, value=None, capacity=2048, span=None, min=None, max=None, typecode='f', bg=MicroGUI.BLACK, fg=MicroGUI.GREEN, gap=4):
+        super().__init__(bg, fg)
+        self.series=Ring(capacity, typecode)
+        self.span=capacity if span is None else span
+        self.autoscale=min is None or max is None
+        self.range=None if self.autoscale else (min, max)
+        self.gap=gap #cleared columns ahead of the cursor
+        self.value=value
+        if value is not None:
+            value.subscribe(self) #every assignment is a sample, also of an equal value
+        self.per_col=1
+        self._top=None #pixel range of the samples in each column, -1 if empty
+        self._bot=None
+        self._seg=None #top and bottom of the line drawn in each column
+        self._drawn=0 #samples included in the drawn columns
+        self._rescale=False
+        self._cmin=self._cmax=0 #range of the current column
+
+    def retainable(self):
+        #the sweep updates a few columns, cheaper than diffing the lines of all columns
+        return False
+
+    def release(self):
+        super().release()
+        if self.value is not None:
+            self.value.unbind(self)
+
+    def append(self, val):
+        self.series.append(val)
+        self._check_range(val)
+        self._changed()
+
+    sample=append #called by the subscribed Var
+
+    def extend(self, values):
+        #batch append, e.g. samples read from a sensor fifo
+        for v in values:
+            self.series.append(v)
+            self._check_range(v)
+        self._changed()
+
+    def _check_range(self, v):
+        if not self.autoscale:
+            return
+        if self.range is None:
+            self.range=(v-1, v+1)
+            self._rescale=True
+        elif v<self.range[0] or v>self.range[1]:
+            #grow with some headroom, each rescale is a full redraw
+            lo,hi=self.range
+            d=(hi-lo)/4
+            self.range=(v-d if v<lo else lo, v+d if v>hi else hi)
+            self._rescale=True
+
+    def _changed(self):
+        self.stale() #a hidden page must not be replayed from the cache either
+        if not self.is_visible or self._top is None:
+            return
+        if self._rescale:
+            self.screen.invalidate(self.win)
+        else:
+            self.screen.update(self)
+
+    def _y(self, v):
+        lo,hi=self.range
+        y=int((hi-v)*(self._h-1)/(hi-lo))
+        if y<0:
+            return 0
+        if y>=self._h:
+            return self._h-1
+        return y
+
+    def _fit(self, first):
+        #value range of the samples from first on
+        s=self.series
+        lo=hi=s.at(first)
+        for i in range(first+1, s.n):
+            v=s.at(i)
+            if v<lo:
+                lo=v
+            elif v>hi:
+                hi=v
+        d=(hi-lo)/10 if hi>lo else 1
+        self.range=(lo-d, hi+d)
+
+    def draw(self, screen=None, win=None):
+        super().draw(screen, win)
+        self.screen.clearwin()
+        s=self.series
+        w=min(self.win[2]-self.win[0], len(s.buf))
+        self._h=self.win[3]-self.win[1]
+        self._top=array('h',[-1]*w)
+        self._bot=array('h',[-1]*w)
+        self._seg=array('h',[0]*2*w)
+        self.per_col=max(1, min(-(-self.span//w), len(s.buf)//w))
+        #block aligned start, leaves the gap in front of the cursor empty
+        pc=self.per_col
+        first=max(0, ((s.n-1)//pc-(w-1-min(self.gap,w-1)))*pc, -(-(s.n-len(s.buf))//pc)*pc)
+        self._drawn=first
+        self._rescale=False
+        if first<s.n:
+            if self.autoscale:
+                self._fit(first)
+            if first>=pc and first-pc>=s.n-len(s.buf):
+                #the first column is connected to the samples before, like when drawn incrementally
+                lo=hi=s.at(first-pc)
+                for i in range(first-pc+1, first):
+                    v=s.at(i)
+                    if v<lo:
+                        lo=v
+                    elif v>hi:
+                        hi=v
+                p=(first//pc-1)%w
+                self._top[p]=self._y(hi)
+                self._bot[p]=self._y(lo)
+                self._seg[2*p]=-1 #nothing drawn
+            self._draw_samples()
+
+    def refresh(self):
+        #draw the samples added since the last refresh, column by column
+        s=self.series
+        if self._rescale or s.n-self._drawn>=(len(self._top)-self.gap)*self.per_col or s.n-self._drawn>len(s.buf):
+            self.draw(None, None)
+            return
+        super().draw(None, None)
+        self._draw_samples()
+
+    def _draw_samples(self):
+        s=self.series
+        w=len(self._top)
+        pc=self.per_col
+        col=-1
+        for i in range(self._drawn, s.n):
+            v=s.at(i)
+            c=(i//pc)%w
+            if c!=col:
+                if col>=0:
+                    self._draw_col(col)
+                col=c
+                if i%pc==0:#new column
+                    self._cmin=self._cmax=v
+                    self._clear_col((c+self.gap)%w)
+                    continue
+            if v<self._cmin:
+                self._cmin=v
+            elif v>self._cmax:
+                self._cmax=v
+        if col>=0:
+            self._draw_col(col)
+        self._drawn=s.n
+
+    def _clear_col(self, c):
+        if self._top[c]>=0:
+            top=self._seg[2*c]
+            if top>=0:
+                self.screen.rect(c,top,1,self._seg[2*c+1]-top+1,self.style.bg,self.style.bg)
+            self._top[c]=-1
+
+    def _draw_col(self, c):
+        top=self._y(self._cmax)
+        bot=self._y(self._cmin)
+        self._clear_col(c)
+        self._top[c]=top
+        self._bot[c]=bot
+        p=(c-1)%len(self._top)
+        if self._top[p]>=0: #connect to the previous column
+            if self._bot[p]<top:
+                top=self._bot[p]
+            if self._top[p]>bot:
+                bot=self._top[p]
+        self._seg[2*c]=top
+        self._seg[2*c+1]=bot
+        self.screen.line(c,top,c,bot,self.style.fg)
+
+def _bind_label(widget, item):
+    widget.text.val=item
+
+class ListView(Widget):
+    #scrollable list of many items, only the visible rows have widgets, recycled while scrolling
+    #row() makes a row widget, bind(widget, item) shows an item in it, by default a Label with widget.text.val=item
+    #command(index, item) is called when an item is tapped
+    #a full width list in portrait orientation is scrolled by the panel, else the visible rows are redrawn
+    __slots__=('items','row_h','row','bind','command','offset','rows','_bound','_shown','_hw','_touch','_v','_flings')
+
+    def __init__(self, items, row_h=24, row=None, bind=None, command=None, bg=MicroGUI.BLACK, fg=MicroGUI.WHITE, style=None):
+        super().__init__(bg, fg, style)
+        self.items=items
+        self.row_h=row_h
+        self.row=row if row is not None else (lambda: Label('', halign=0))
+        self.bind=bind if bind is not None else _bind_label
+        self.command=Command.wrap(command, self)
+        self.offset=0 #pixel row of the list at the top of the window
+        self.rows=[] #recycled row widgets, row widget i%len(rows) shows item i
+        self._bound=None #item shown by each row widget, -1 for none
+        self._shown=0 #offset on screen
+        self._hw=False #scrolled by the panel, the rows are kept in a ring in the panel memory
+        self._touch=None #[y, offset, dragging] of the current touch
+        self._v=0 #kinetic scrolling speed [px/s]
+        self._flings=0 #number of the current kinetic scroll, a new touch stops it
+
+    def set_items(self, items):
+        #show other items, or the same list after it changed
+        self.items=items
+        self._bound=None #the offset is limited to the new length by draw()
+        self.invalidate()
+
+    def max_offset(self):
+        win=self.win
+        return max(0, len(self.items)*self.row_h-(win[3]-win[1]))
+
+    def draw(self, screen=None, win=None):
+        super().draw(screen, win)
+        win=self.win
+        h=win[3]-win[1]
+        n=h//self.row_h+2 #enough for the visible rows, even partly visible at both ends
+        while len(self.rows)<n:
+            w=self.row()
+            w.parent=self
+            self.rows.append(w)
+        if self._bound is None or len(self._bound)!=len(self.rows):
+            self._bound=array('i',[-1]*len(self.rows))
+        self.offset=min(self.offset, self.max_offset())
+        if self.screen._hold: #recorded: the rows at their screen position, the panel scrolling is kept
+            self._paint(self.offset, self.offset+h, win[1]-self.offset)
+            return
+        self._hw=self.screen.vscroll_define(win)
+        if self._hw:
+            self.screen.vscroll(win[1]+self.offset%h)
+        self._shown=self.offset
+        self._draw_rows(self.offset, self.offset+h)
+
+    def _row(self, i):
+        #row widget showing item i
+        k=i%len(self.rows)
+        w=self.rows[k]
+        if self._bound[k]!=i:
+            w.deactivate() #not redrawn by the binding
+            self.bind(w, self.items[i])
+            self._bound[k]=i
+        return w
+
+    def _draw_rows(self, c0, c1):
+        #draw the pixel rows c0..c1 of the list, into the ring of panel memory rows when scrolled by the panel
+        win=self.win
+        if not self._hw:
+            self._paint(c0, c1, win[1]-self.offset)
+            return
+        h=win[3]-win[1]
+        while c0<c1:
+            m=c0%h
+            n=min(c1-c0, h-m)
+            self._paint(c0, c0+n, win[1]+m-c0)
+            c0+=n
+
+    def _paint(self, c0, c1, dy):
+        #draw the pixel rows c0..c1 of the list at the screen rows c0+dy..c1+dy
+        screen=self.screen
+        win=self.win
+        clip=(win[0], c0+dy, win[2], c1+dy)
+        screen.setbox(clip)
+        screen.rect(0, 0, clip[2]-clip[0], c1-c0, self.style.bg, self.style.bg)
+        rh=self.row_h
+        for i in range(c0//rh, min(-(-c1//rh), len(self.items))):
+            rwin=(win[0], i*rh+dy, win[2], (i+1)*rh+dy)
+            w=self._row(i)
+            if _contains(clip, rwin):
+                w.draw(screen, rwin)
+            else:
+                screen.draw_clipped(w, rwin, clip)
+
+    def scroll_to(self, offset):
+        #show the list from pixel row offset, drawn with the next flush
+        #before the first layout the offset is kept and limited by draw()
+        offset=max(0, offset)
+        if self.win is not None:
+            offset=min(offset, self.max_offset())
+        if offset!=self.offset:
+            self.offset=offset
+            if self.is_visible:
+                self.screen.update(self)
+
+    def refresh(self):
+        #scroll from the offset on screen to the current one, the cost depends on the window only
+        win=self.win
+        h=win[3]-win[1]
+        old=self._shown
+        new=self.offset
+        if new==old:
+            return
+        self._shown=new
+        if not self._hw:
+            self._draw_rows(new, new+h)
+            return
+        self.screen.vscroll(win[1]+new%h)
+        if abs(new-old)>=h:
+            self._draw_rows(new, new+h)
+        elif new>old: #draw the rows that scrolled in, into the memory of those that scrolled out
+            self._draw_rows(old+h, new+h)
+        else:
+            self._draw_rows(new, old)
+
+    def on_touch(self, pos, win, screen):
+        self._flings+=1
+        self._touch=[pos[1], self.offset, False]
+        return self, win
+
+    def on_move(self, pos, win, screen):
+        t=self._touch
+        d=t[0]-pos[1]
+        if not t[2] and -6<d<6: #still a tap
+            return
+        t[2]=True
+        self.scroll_to(t[1]+d)
+
+    def on_release(self, pos, win, screen):
+        t=self._touch
+        self._touch=None
+        if t is None:
+            return
+        if t[2]:
+            self._v=-screen.touch_velocity()[1]
+            if abs(self._v)>200:
+                self._flings+=1
+                _event_loop().create_task(self._fling(self._flings))
+            return
+        i=(self.offset+t[0]-win[1])//self.row_h
+        if self.command is not None and i<len(self.items):
+            self.command(i, self.items[i])
+
+    async def _fling(self, n):
+        #kinetic scrolling after a drag, slowed down by friction
+        pos=self.offset*1000
+        while n==self._flings and self.is_visible:
+            pos+=self._v*20 #px/s * ms
+            self.scroll_to(pos//1000)
+            if not 0<self.offset<self.max_offset() or -50<self._v<50:
+                break
+            self._v=self._v*15//16
+            await _sleep_ms(20)
+
+    def cacheable(self):
+        #scrolled without invalidate()
+        return False
+
+    def deactivate(self):
+        super().deactivate()
+        self._flings+=1
+        if self._hw:
+            self.screen.vscroll(self.win[1])
+            self._hw=False
+        for w in self.rows:
+            w.deactivate()
+
+    def release(self):
+        self.deactivate()
+        for w in self.rows:
+            w.release()
+        self.rows=[]
+        self._bound=None
 
 class DynamicWidget(Widget):
-    def __init__(self):
+    __slots__=('interval','is_active')
+
+    def __init__(self, interval=1000):
         super().__init__()
+        self.interval=interval #update period [ms]
         self.is_active=False
+
+    def cacheable(self):
+        return False
         
-    def activate(self, screen,win, interval=1):
+    def activate(self, screen,win, interval=None):
+        #register with the scheduler of the screen, suspended by deactivate()
+        if interval is not None:
+            self.interval=interval
+        self.place(screen, win)
         self.is_active=True
-        self.is_visible=True
-        loop = asyncio.get_event_loop()
-        loop.create_task(self.mainloop(screen,win, interval)) 
-    
-    async def mainloop(self,screen, win, interval):
-        while self.is_active and self.is_visible:
-            self.update(screen,win)
-            await asyncio.sleep(interval)
-        self.is_active=False
+        screen.scheduler.add(self, self.interval)
+
+    def deactivate(self):
+        super().deactivate()
+        if self.is_active:
+            self.is_active=False
+            self.screen.scheduler.remove(self)
+
+    def release(self):
+        self.deactivate()
 
     def update(self, screen, win):
-        #do something
-        #print('dynamic widget update is not implemented')
-        self.draw(screen, win)
+        #called by the scheduler every interval
+        self.invalidate()
 
 class Clock(DynamicWidget):
-    def __init__(self, halign=1, valign=1):
-        super().__init__()
+    __slots__=('halign','valign','fmt','_text','_box')
+
+    def __init__(self, halign=1, valign=1, fmt='{2}.{1:02d}.{0} - {3}:{4:02d}:{5:02d} Uhr'):
+        super().__init__(1000)
         self.halign=halign
         self.valign=valign
-        RTC().ntp_sync(server="hr.pool.ntp.org", tz="CET-1CEST")
+        self.fmt=fmt
+        self._text=None #text and box on screen
+        self._box=None
+
+    def _now(self):
+        #until the time source is synced the digits are shown as dashes
+        text=self.fmt.format(*self.screen.time_source.localtime())
+        if self.screen.time_source.synced:
+            return text
+        return ''.join('-' if c.isdigit() else c for c in text)
 
-    
     def draw(self,screen=None, win=None):
         super().draw(screen, win)
         if not self.is_active:
-            self.activate(screen, win)
+            self.activate(self.screen, self.win)
         self.screen.clearwin()
-        now=utime.localtime()
-        text='{2}.{1:02d}.{0} - {3}:{4:02d}:{5:02d} Uhr'.format(*now)
-        self.screen.text(self.screen.halign_const[self.halign],self.screen.valign_const[self.valign],text)
+        self._draw_text(self._now())
 
+    def _draw_text(self, text):
+        box=self.screen.text_box(self.halign, self.valign, text)
+        self.screen.text(box[0], box[1], text)
+        self._text=text
+        self._box=box
 
-class FotoFrame(Widget):
-    pass
+    def update(self, screen, win):
+        if self._box is not None:
+            screen.update(self)
+        else:
+            self.invalidate()
+
+    def refresh(self):
+        #repaint the changed fields only, usually the seconds
+        text=self._now()
+        if text==self._text:
+            return
+        super().draw(None, None)
+        old=self._box
+        box=self.screen.text_box(self.halign, self.valign, text)
+        if box[0]==old[0] and box[2]==old[2]:
+            self.screen.text_delta(box[0], box[1], self._text, text, self.style.bg)
+            self._text=text
+        else:
+            self.screen.rect(old[0],old[1],old[2],old[3],self.style.bg,self.style.bg)
+            self._draw_text(text)
+
+
+#images are streamed in bands of rows, converted to the panel format on the way
+#.565 files hold panel ready pixels: 8 byte header (b'565\0', width, height) and RGB565 big endian rows
+_RAW_MAGIC=b'565\x00'
+
+def _image_info(f):
+    #(width, height, bytes per pixel, format, offset of the first row, row stride) of a BMP or .565 file
+    #the stride is negative for bottom up rows, format is 'bgr', 'le565' or 'raw'
+    head=f.read(54)
+    if head[:4]==_RAW_MAGIC:
+        w,h=struct.unpack('>HH',head[4:8])
+        return (w,h,2,'raw',8,2*w)
+    if head[:2]!=b'BM' or len(head)<54:
+        raise GuiException('unsupported image format')
+    off,=struct.unpack('<I',head[10:14])
+    w,h,planes,bpp,comp=struct.unpack('<iiHHI',head[18:34])
+    if bpp==16:
+        masks=f.read(12) if comp==3 else b''
+        if len(masks)<4 or struct.unpack('<I',masks[:4])[0]!=0xF800:
+            raise GuiException('16 bit BMP must be RGB565')
+        fmt='le565'
+    elif bpp in (24,32) and comp in (0,3):
+        fmt='bgr'
+    else:
+        raise GuiException('unsupported BMP: {} bit, compression {}'.format(bpp,comp))
+    stride=(w*bpp+31)//32*4
+    if h>0:#bottom up
+        return (w,h,bpp//8,fmt,off+(h-1)*stride,-stride)
+    return (w,-h,bpp//8,fmt,off,stride)
+
+def _fit(w, h, ww, wh):
+    #size of a w x h image scaled down to fit into ww x wh, keeps the aspect ratio
+    if w<=ww and h<=wh:
+        return (w,h)
+    if w*wh>h*ww:
+        return (ww, max(1,h*ww//w))
+    return (max(1,w*wh//h), wh)
+
+def _jpeg_size(f):
+    #width and height from the SOF marker
+    if f.read(2)!=b'\xff\xd8':
+        raise GuiException('not a jpeg file')
+    while True:
+        m=f.read(4)
+        if len(m)<4 or m[0]!=0xFF:
+            raise GuiException('jpeg size not found')
+        n=(m[2]<<8)|m[3]
+        if m[1] in (0xC0,0xC1,0xC2):
+            d=f.read(5)
+            return ((d[3]<<8)|d[4], (d[1]<<8)|d[2])
+        f.seek(n-2,1)
+
+@_native
+def _convert_row(src, fmt, xmap, out, o):
+    #nearest neighbour columns of one source row to panel pixels
+    #the panel gets swapped and inverted colors, like rgb565(rgb(r,g,b))
+    if fmt=='raw':
+        for i in xmap:
+            out[o]=src[i]
+            out[o+1]=src[i+1]
+            o+=2
+    elif fmt=='bgr':
+        for i in xmap:
+            b=src[i]
+            g=src[i+1]
+            r=src[i+2]
+            out[o]=~((b&0xF8)|(g>>5))&0xFF
+            out[o+1]=~(((g<<3)&0xE0)|(r>>3))&0xFF
+            o+=2
+    else:#le565
+        for i in xmap:
+            v=src[i]|(src[i+1]<<8)
+            v=~(((v&0x1F)<<11)|(v&0x7E0)|(v>>11))
+            out[o]=(v>>8)&0xFF
+            out[o+1]=v&0xFF
+            o+=2
+
+def _decode_bands(f, info, w, h, buf):
+    #fill buf with rows of the image scaled to w x h, yields the first row and the number of rows
+    sw,sh,bpp,fmt,first,stride=info
+    rows=len(buf)//(2*w)
+    xmap=array('i',[x*sw//w*bpp for x in range(w)])
+    src=bytearray(abs(stride))
+    last=-1
+    y=0
+    while y<h:
+        n=min(rows,h-y)
+        for i in range(n):
+            sy=(y+i)*sh//h
+            if sy!=last:
+                f.seek(first+sy*stride)
+                f.readinto(src)
+                last=sy
+            _convert_row(src, fmt, xmap, buf, 2*w*i)
+        yield y,n
+        y+=n
+
+class ImageCache:
+    #panel ready .565 versions of scaled images in a directory, at most capacity bytes
+    #the least recently used files are deleted, the order is kept in index.json
+    def __init__(self, path='/sd/.fotocache', capacity=2*1024*1024):
+        self.path=path
+        self.lru=LRUCache(capacity, evict=self._remove, low=capacity) #each file evicted costs a decode
+        try:
+            os.mkdir(path)
+        except OSError:
+            pass
+        try:
+            with open(path+'/index.json') as f:
+                for name,size in json.load(f):
+                    self.lru.put(name, True, size)
+        except (OSError, ValueError):
+            pass
+
+    def name(self, src, w, h):
+        return '{}_{}x{}.565'.format(src.replace('/','_').replace('.','_'), w, h)
+
+    def get(self, name):
+        #full path of a cached file or None
+        if self.lru.get(name) is None:
+            return None
+        return self.path+'/'+name
+
+    def add(self, name, tmp):
+        #move the written file tmp into the cache
+        size=os.stat(tmp)[6]
+        try:
+            os.remove(self.path+'/'+name)
+        except OSError:
+            pass
+        os.rename(tmp, self.path+'/'+name)
+        self.lru.put(name, True, size)
+        if self.lru.get(name) is None: #larger than the cache
+            self._remove(name, True)
+        self.save()
+
+    def save(self):
+        with open(self.path+'/index.json','w') as f:
+            json.dump(self.lru.sizes(), f)
+
+    def _remove(self, name, value):
+        try:
+            os.remove(self.path+'/'+name)
+        except OSError:
+            pass
+
+class FotoFrame(DynamicWidget):
+    #shows BMP (16, 24 or 32 bit) and .565 images scaled to the widget, JPEG is left to the display module
+    #with several images it is a slideshow, the next image is converted into the cache in the background
+    __slots__=('images','index','cache','band','stats','_prefetching')
+
+    def __init__(self, images, interval=10000, cache=None, band=8192, bg=MicroGUI.BLACK):
+        super().__init__(interval)
+        self.style=Style.get(bg)
+        self.images=[images] if isinstance(images, str) else list(images)
+        self.index=0
+        self.cache=cache #ImageCache or None
+        self.band=band #bytes of the row buffer, bounds the memory used for decoding
+        self.stats={'cached':0, 'decoded':0, 'prefetched':0}
+        self._prefetching=False
+
+    def cacheable(self):
+        return False
+
+    def update(self, screen, win):
+        self.index=(self.index+1)%len(self.images)
+        self.invalidate()
+
+    def draw(self, screen=None, win=None):
+        super().draw(screen, win)
+        if len(self.images)>1 and not self.is_active:
+            self.activate(self.screen, self.win)
+        screen=self.screen
+        screen.clearwin()
+        if screen._hold: #recorded, e.g. for a page transition: the image is not a primitive
+            return
+        if screen.fb is not None: #the image goes directly to the panel, push what is below first
+            screen.flush_framebuffer()
+        path=self.images[self.index]
+        try:
+            self._show(path)
+        except (OSError, GuiException) as e:
+            screen.text(screen.CENTER, screen.CENTER, '{}'.format(e))
+        if len(self.images)>1:
+            self.prefetch((self.index+1)%len(self.images))
+
+    def _size(self, info):
+        return _fit(info[0], info[1], self.win[2]-self.win[0], self.win[3]-self.win[1])
+
+    def _show(self, path):
+        screen=self.screen
+        lower=path.lower()
+        if lower.endswith('.jpg') or lower.endswith('.jpeg'):
+            self._show_jpeg(path)
+            return
+        with open(path,'rb') as f:
+            info=_image_info(f)
+            w,h=self._size(info)
+            x=self.win[0]+(self.win[2]-self.win[0]-w)//2
+            y=self.win[1]+(self.win[3]-self.win[1]-h)//2
+            buf=bytearray(max(2*w, self.band//(2*w)*2*w))
+            name=None
+            if self.cache is not None and (info[3]!='raw' or (w,h)!=(info[0],info[1])):
+                name=self.cache.name(path,w,h)
+            cached=self.cache.get(name) if name is not None else None
+            if cached is not None:
+                #sequential read and blit
+                with open(cached,'rb') as c:
+                    c.seek(8)
+                    mv=memoryview(buf)
+                    rows=len(buf)//(2*w)
+                    for y0 in range(0,h,rows):
+                        n=min(rows,h-y0)
+                        c.readinto(mv[:2*w*n])
+                        screen.blit(x,y+y0,w,n,mv[:2*w*n])
+                self.stats['cached']+=1
+            else:
+                out=None
+                if name is not None:
+                    tmp=self.cache.path+'/.tmp'
+                    out=open(tmp,'wb')
+                    out.write(_RAW_MAGIC+struct.pack('>HH',w,h))
+                try:
+                    mv=memoryview(buf)
+                    for y0,n in _decode_bands(f, info, w, h, buf):
+                        screen.blit(x,y+y0,w,n,mv[:2*w*n])
+                        if out is not None:
+                            out.write(mv[:2*w*n])
+                finally:
+                    if out is not None:
+                        out.close()
+                if out is not None:
+                    self.cache.add(name, tmp)
+                self.stats['decoded']+=1
+            screen.pixels+=w*h
+
+    def _show_jpeg(self, path):
+        #decoded by the display module, scaled by powers of 2
+        screen=self.screen
+        if not hasattr(screen.tft, 'image'):
+            raise GuiException('no jpeg decoder')
+        with open(path,'rb') as f:
+            w,h=_jpeg_size(f)
+        ww=self.win[2]-self.win[0]
+        wh=self.win[3]-self.win[1]
+        scale=0
+        while scale<3 and (w>>scale>ww or h>>scale>wh):
+            scale+=1
+        screen.tft.image(screen.CENTER, screen.CENTER, path, scale)
+        screen.pixels+=(w>>scale)*(h>>scale)
+
+    def prefetch(self, index):
+        #convert an image into the cache in the background
+        if self.cache is None or self._prefetching:
+            return
+        path=self.images[index]
+        lower=path.lower()
+        if lower.endswith('.jpg') or lower.endswith('.jpeg'):
+            return
+        self._prefetching=True
+        _event_loop().create_task(self._prefetch(path))
+
+    async def _prefetch(self, path):
+        try:
+            with open(path,'rb') as f:
+                info=_image_info(f)
+                w,h=self._size(info)
+                name=self.cache.name(path,w,h)
+                if self.cache.get(name) is not None or (info[3]=='raw' and (w,h)==(info[0],info[1])):
+                    return
+                buf=bytearray(max(2*w, self.band//(2*w)*2*w))
+                tmp=self.cache.path+'/.prefetch'
+                with open(tmp,'wb') as out:
+                    out.write(_RAW_MAGIC+struct.pack('>HH',w,h))
+                    mv=memoryview(buf)
+                    for y0,n in _decode_bands(f, info, w, h, buf):
+                        out.write(mv[:2*w*n])
+                        await _sleep_ms(0) #let the touch loop run
+                self.cache.add(name, tmp)
+                self.stats['prefetched']+=1
+        except (OSError, GuiException):
+            pass
+        finally:
+            self._prefetching=False
+
+class _Batch:
+    #context returned by Var.batch()
+    def __enter__(self):
+        Var._depth+=1
+        return self
+
+    def __exit__(self, *exc):
+        Var._depth-=1
+        if Var._depth==0:
+            Var._drain()
+        return False
 
 class Var:
+    __slots__=('_val','widgets','samplers')
+    _depth=0 #nesting level of batch()
+    _pending={} #widgets to notify at the end of the batch
+
     def __init__(self, val, widget=None):
-        self.__val=val
+        self._val=val
         self.widgets=[]
+        self.samplers=None #see subscribe()
         if isinstance(widget, Widget):
             self.widgets.append(widget)
         
 
     @property
     def val(self):
-        return self.__val
+        return self._val
     
     @val.setter
     def val(self, val):
-        self.__val=val
-        for w in self.widgets:
-            if w.is_visible:
-                w.draw()
+        #assigning an equal value does not notify the widgets, use notify() after changing a list in place
+        if self.samplers is not None:
+            for w in self.samplers:
+                w.sample(val)
+        if val==self._val:
+            return
+        self._val=val
+        Var._notify(self.widgets)
+
+    def notify(self):
+        Var._notify(self.widgets)
+
+    @staticmethod
+    def batch():
+        #with Var.batch(): ... notifies each bound widget once, after the last assignment
+        #subscribed widgets get every value when it is assigned
+        return _Batch()
+
+    @staticmethod
+    def _notify(widgets):
+        if Var._depth:
+            for w in widgets:
+                Var._pending[w]=True
+        else:
+            for w in widgets:
+                w.invalidate()
+
+    @staticmethod
+    def _drain():
+        #widgets notified by Computed vars during the drain are collected as well
+        pending=Var._pending
+        done={}
+        Var._depth+=1
+        try:
+            while pending:
+                w=pending.popitem()[0]
+                if w not in done:
+                    done[w]=True
+                    w.invalidate()
+        finally:
+            Var._depth-=1
+
+    def subscribe(self, widget):
+        #widget.sample(val) is called with every assigned value, also equal ones and within batch()
+        #e.g. a Chart, which streams samples rather than showing the current value
+        if self.samplers is None:
+            self.samplers=[]
+        self.samplers.append(widget)
+
+    def unbind(self, widget):
+        if widget in self.widgets:
+            self.widgets.remove(widget)
+        if self.samplers is not None and widget in self.samplers:
+            self.samplers.remove(widget)
+
+class Computed(Var):
+    #value derived from other Vars as fn(*values), computed when read after an input changed
+    #e.g. Computed(lambda raw: raw*100//1023, adc)
+    __slots__=('fn','inputs','_dirty')
+
+    def __init__(self, fn, *inputs):
+        super().__init__(None)
+        self.fn=fn
+        self.inputs=inputs
+        self._dirty=True
+        for v in inputs:
+            v.widgets.append(self)
+
+    def _get(self):
+        if self._dirty:
+            self._dirty=False
+            self._val=self.fn(*[v.val for v in self.inputs])
+        return self._val
+
+    def _set(self, val):
+        raise GuiException('Computed values cannot be assigned')
+
+    val=property(_get, _set)
+
+    def invalidate(self):
+        #an input changed, the bound widgets read the new value when they are drawn
+        self._dirty=True
+        if self.samplers is not None:
+            val=self.val
+            for w in self.samplers:
+                w.sample(val)
+        Var._notify(self.widgets)
+
+    def release(self):
+        #detach from the inputs
+        for v in self.inputs:
+            v.unbind(self)
 
@@ -0,0 +1,382 @@
+#host tests on the headless backend: python -m unittest test_microgui (or pytest)
+#the rendering paths must produce the same pixels as a full redraw, in all render configurations
+import asyncio
+import os
+import struct
+import tempfile
+import unittest
+
+import microgui as gui
+import bench
+
+PORTRAIT=gui.HeadlessTFT.PORTRAIT
+LANDSCAPE_FLIP=gui.HeadlessTFT.LANDSCAPE_FLIP
+
+def screen(rot=LANDSCAPE_FLIP, new_loop=True, **config):
+    if new_loop:
+        asyncio.set_event_loop(asyncio.new_event_loop())
+    tft=gui.HeadlessTFT()
+    s=gui.MicroGUI(tft)
+    s.init(s.ILI9488, width=240, height=320, rot=rot, **config)
+    s.touch_fast=1
+    s.touch_slow=2
+    return s, tft
+
+def close(s):
+    s.initiated=0
+    bench.close(asyncio.get_event_loop())
+
+def image(tft):
+    return bytes(tft.fb.buf)
+
+def full_redraw(s, tft):
+    #drop the cached page renderings first, the reference must not replay a stale one
+    s.relayout()
+    s.invalidate(s.root_win)
+    s.flush()
+    return image(tft)
+
+def play(s, trace):
+    #feed the trace to the touch loop and wait for the last frame
+    s.touch_source=trace
+    async def wait():
+        while not trace.done:
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.01)
+        while s.renderer.pending() or s.animator.running:
+            await asyncio.sleep(0.005)
+    asyncio.get_event_loop().run_until_complete(wait())
+
+class TestRendering(unittest.TestCase):
+    def setUp(self):
+        gui.localtime=lambda: (2026,10,18,9,59,58,0,0)
+
+    def test_traces_match_full_redraw(self):
+        for tname,trace in bench.TRACES:
+            images=[]
+            for cname,config in bench.CONFIGS:
+                s,tft=screen(**config)
+                bench.build(s)
+                s.draw()
+                play(s, trace())
+                img=image(tft)
+                self.assertEqual(img, full_redraw(s, tft), tname+'/'+cname)
+                images.append(img)
+                close(s)
+            for img in images[1:]:
+                self.assertEqual(img, images[0], tname)
+
+    def test_frames_do_not_read_touch(self):
+        #the touch loop reads the samples, a frame dispatches the latest move it left
+        s,tft=screen()
+        bench.build(s)
+        s.draw()
+        frame=s.renderer.frame
+        reads=[]
+        def counted():
+            n=s.touch_samples
+            us=frame()
+            reads.append(s.touch_samples-n)
+            return us
+        s.renderer.frame=counted
+        play(s, bench.trace_slider_drag())
+        self.assertTrue(reads)
+        self.assertEqual(sum(reads), 0)
+        close(s)
+
+    def test_slider_retained_pixels(self):
+        #retained mode keeps the incremental Slider update
+        pixels=[]
+        for config in ({}, {'retained':True}):
+            s,tft=screen(**config)
+            v=gui.Var(10)
+            s.root=gui.Frame(side=0)
+            s.root.pack(gui.Label('Licht'))
+            s.root.pack(gui.Slider(v))
+            s.draw()
+            p=s.pixels
+            for val in (30, 90, 20, 80):
+                v.val=val
+                s.flush()
+            pixels.append(s.pixels-p)
+            self.assertEqual(image(tft), full_redraw(s, tft))
+            close(s)
+        self.assertLessEqual(pixels[1], pixels[0])
+
+    def test_slider_knob_color(self):
+        #0 and 1 share the knob position on a short bar, but not the knob color
+        s,tft=screen()
+        v=gui.Var(1)
+        s.root=gui.Frame()
+        s.root.pack(gui.Slider(v, min=0, max=1000))
+        s.root.pack(gui.Label('x'), size=3)
+        s.draw()
+        v.val=0
+        s.flush()
+        self.assertEqual(image(tft), full_redraw(s, tft))
+        close(s)
+
+    def test_hidden_page_update(self):
+        #a value changed while its page is hidden is shown when the page is back
+        s,tft=screen()
+        v=gui.Var(1)
+        m=gui.Menue(40)
+        m.add_page('Wert').pack(gui.Label(v, decoration='{}%'))
+        m.add_page('Text').pack(gui.Label('x'))
+        s.root=m
+        s.draw()
+        for x,val in ((240,99), (80,99)):
+            m.on_release((x,20), s.root_win, s)
+            v.val=val
+            s.flush()
+        img=image(tft)
+        self.assertEqual(img, full_redraw(s, tft))
+        v.val=1
+        self.assertNotEqual(img, full_redraw(s, tft))
+        close(s)
+
+    def test_label_notify(self):
+        s,tft=screen()
+        v=gui.Var([1,2])
+        s.root=gui.Label(v)
+        s.draw()
+        before=image(tft)
+        v.val.append(3)
+        v.notify()
+        s.flush()
+        self.assertNotEqual(image(tft), before)
+        self.assertEqual(image(tft), full_redraw(s, tft))
+        close(s)
+
+class TestChart(unittest.TestCase):
+    def test_sweep_matches_full_redraw(self):
+        for capacity,step in ((2048,1), (2048,13), (200,3)):
+            s,tft=screen()
+            c=gui.Chart(capacity=capacity, min=-20, max=30)
+            s.root=c
+            s.draw()
+            for i in range(0, 5000, step):
+                c.extend([(j*7)%41-15 for j in range(i, i+step)])
+                s.flush()
+            self.assertLessEqual(len(c._top)*c.per_col, capacity)
+            self.assertEqual(image(tft), full_redraw(s, tft), capacity)
+            close(s)
+
+    def test_hidden_page(self):
+        #samples that arrive while the page is hidden drop its cached rendering
+        s,tft=screen()
+        c=gui.Chart(capacity=200, min=-20, max=30)
+        m=gui.Menue(40)
+        m.add_page('Chart').pack(c)
+        m.add_page('Text').pack(gui.Label('x'))
+        s.root=m
+        c.extend([(j*7)%41-15 for j in range(50)])
+        s.draw()
+        for x,samples in ((240,100), (80,0)):
+            m.on_release((x,20), s.root_win, s)
+            c.extend([(j*11)%41-15 for j in range(samples)])
+            s.flush()
+        self.assertEqual(image(tft), full_redraw(s, tft))
+        close(s)
+
+    def test_var_samples(self):
+        v=gui.Var(0.0)
+        c=gui.Chart(value=v)
+        for i in range(50):
+            v.val=20.0
+        with gui.Var.batch():
+            for i in range(10):
+                v.val=float(i)
+        self.assertEqual(c.series.n, 60)
+
+class TestListView(unittest.TestCase):
+    def make(self, s, early=None):
+        lv=gui.ListView(['Eintrag {}'.format(i) for i in range(1000)])
+        if early is not None:
+            lv.scroll_to(early)
+        s.root=gui.Frame(side=0)
+        s.root.pack(gui.Label('Liste'))
+        s.root.pack(lv, size=6)
+        return lv
+
+    def test_scroll_matches_full_redraw(self):
+        for rot in (PORTRAIT, LANDSCAPE_FLIP): #scrolled by the panel, redrawn
+            s,tft=screen(rot)
+            lv=self.make(s)
+            s.draw()
+            self.assertEqual(lv._hw, rot==PORTRAIT)
+            for d in (5, 37, -12, 400, -300):
+                lv.scroll_to(lv.offset+d)
+                s.flush()
+                img=image(tft)
+                lv.deactivate() #back to unscrolled panel memory
+                self.assertEqual(img, full_redraw(s, tft), (rot, d))
+            close(s)
+
+    def test_scroll_before_layout(self):
+        s,tft=screen(PORTRAIT)
+        lv=self.make(s, early=130)
+        s.draw()
+        self.assertEqual(lv.offset, 130)
+        close(s)
+
+class TestTransitions(unittest.TestCase):
+    def test_slide_ends_like_a_switch(self):
+        images=[]
+        for transition in (None, 'slide', 'fade'):
+            s,tft=screen()
+            bench.build(s)
+            s.root.transition=transition
+            s.draw()
+            play(s, bench.tap(gui.ScriptedTouch(), 30, 60))
+            images.append(image(tft))
+            self.assertEqual(images[-1], full_redraw(s, tft), transition)
+            close(s)
+        self.assertEqual(images[1], images[0])
+        self.assertEqual(images[2], images[0])
+
+    def test_record_has_no_side_effects(self):
+        path=os.path.join(tempfile.mkdtemp(), 'img.565')
+        with open(path, 'wb') as f:
+            f.write(gui._RAW_MAGIC+struct.pack('>HH',100,80)+bytes(100*80*2))
+        s,tft=screen(PORTRAIT)
+        lv=gui.ListView(['Eintrag {}'.format(i) for i in range(100)])
+        s.root=gui.Frame(side=0)
+        s.root.pack(lv)
+        s.root.pack(gui.FotoFrame(path))
+        lv.scroll_to(130)
+        s.draw()
+        before=image(tft)
+        cmds=[]
+        write=tft.tft_writecmddata
+        tft.tft_writecmddata=lambda cmd, data: cmds.append(cmd) or write(cmd, data)
+        ops=s.record(s.root, s.root_win)
+        self.assertEqual(cmds, [])
+        self.assertEqual(image(tft), before)
+        #rows at their screen position: the first visible item is near the top
+        texts={op[5][2]:op[1][1] for op in ops if op[0]==gui._TEXT}
+        self.assertLess(texts['Eintrag 5'], 24)
+        close(s)
+
+class TestWidgets(unittest.TestCase):
+    def test_two_screens(self):
+        s1,t1=screen()
+        l1=gui.Label('a')
+        s1.root=l1
+        s1.draw()
+        s2,t2=screen(new_loop=False)
+        s2.root=gui.Label('b')
+        s2.draw()
+        self.assertIs(l1.screen, s1)
+        s1.initiated=0
+        close(s2)
+
+    def test_style_attributes(self):
+        sl=gui.Slider(5)
+        sl.ball_r=6
+        sl.bg=gui.MicroGUI.RED
+        self.assertEqual((sl.ball_r, sl.style.ball_r, sl.bg), (6, 6, gui.MicroGUI.RED))
+
+    def test_style_attributes_stay_private(self):
+        a=gui.Slider(gui.Var(1))
+        b=gui.Slider(gui.Var(2))
+        n=len(gui.Style._shared)
+        for color in range(100):
+            a.bg=color
+        self.assertEqual((len(gui.Style._shared), a.bg, b.bg), (n, 99, gui.MicroGUI.BLACK))
+
+    def test_shared_style(self):
+        a=gui.Slider(gui.Var(1))
+        b=gui.Slider(gui.Var(2))
+        self.assertIs(a.style, b.style)
+        self.assertIsNot(gui.Slider(gui.Var(3), ball_r=6).style, a.style)
+
+    def test_win_before_layout(self):
+        f=gui.Frame()
+        f.pack(gui.Label('x'))
+        f.layout((0,0,100,100))
+        w=gui.Label('y')
+        f.pack(w)
+        self.assertIsNone(w.win)
+        f.layout((0,0,100,100))
+        self.assertEqual(w.win, (0,50,100,100))
+
+class TestCache(unittest.TestCase):
+    def test_lru(self):
+        evicted=[]
+        c=gui.LRUCache(4, evict=lambda key, value: evicted.append(key))
+        for key in 'abcd':
+            c.put(key, key.upper())
+        self.assertEqual(c.get('a'), 'A')
+        c.put('e', 'E') #evicts the least recently used until it fits in 3/4 of the capacity
+        self.assertEqual(evicted, ['b', 'c'])
+        self.assertEqual(c.sizes(), [['d',1], ['a',1], ['e',1]])
+        self.assertEqual((c.get('b'), c.get('d'), c.size), (None, 'D', 3))
+
+class TestVar(unittest.TestCase):
+    def test_change_detection(self):
+        calls=[]
+        class Bound:
+            def invalidate(self):
+                calls.append(self)
+        a=gui.Var(1)
+        b=gui.Var(2)
+        c=gui.Computed(lambda a, b: a+b, a, b)
+        w=Bound()
+        a.widgets.append(w)
+        c.widgets.append(w)
+        a.val=1
+        self.assertEqual(calls, [])
+        with gui.Var.batch():
+            a.val=5
+            b.val=7
+        self.assertEqual((len(calls), c.val), (1, 12))
+
+class TestBoot(unittest.TestCase):
+    def test_first_frame_does_not_collect(self):
+        #the heap of the first frame is read without a full collection, unless debug
+        collect=gui.gc.collect
+        calls=[]
+        gui.gc.collect=lambda: calls.append(1)
+        gui.gc.mem_alloc=lambda: 1000
+        gui.gc.mem_free=lambda: 3000
+        try:
+            for debug in (False, True):
+                s,tft=screen()
+                s.debug=debug
+                s.root=gui.Label('x')
+                s.draw()
+                self.assertEqual((len(calls), s.boot_info()['heap_used']), (debug, 1000))
+                close(s)
+        finally:
+            gui.gc.collect=collect
+            del gui.gc.mem_alloc, gui.gc.mem_free
+
+class TestCalibration(unittest.TestCase):
+    def test_roundtrip(self):
+        #raw samples of a rotated and skewed panel, fitted once, mapped in every orientation
+        s,tft=screen(PORTRAIT)
+        def raw(p):
+            return (3600-p[0]*13+p[1]//20, 300+p[1]*11)
+        native=[(20,20), (220,30), (120,160), (30,300), (210,290)]
+        m=gui.solve_affine([raw(p) for p in native], native)
+        s.set_touch_calibration(m)
+        path=os.path.join(tempfile.mkdtemp(), 'cal.json')
+        s.save_touch_calibration(path)
+        s.touch_affine=None
+        self.assertTrue(s.load_touch_calibration(path))
+        pos=s.touch_pos
+        for rot in (PORTRAIT, gui.HeadlessTFT.LANDSCAPE, gui.HeadlessTFT.PORTRAIT_FLIP, LANDSCAPE_FLIP):
+            s.orient(rot)
+            r=s._rotation(rot)
+            for p in ((5,7), (120,160), (235,310)):
+                x,y=raw(p)
+                tft.gettouch=lambda raw=False: (True, y, x)
+                self.assertTrue(s._read_touch(pos))
+                expected=(r[0]*p[0]+r[1]*p[1]+r[2], r[3]*p[0]+r[4]*p[1]+r[5])
+                self.assertLessEqual(abs(pos[0]-expected[0]), 1, (rot, p))
+                self.assertLessEqual(abs(pos[1]-expected[1]), 1, (rot, p))
+        close(s)
+
+if __name__=='__main__':
+    unittest.main()